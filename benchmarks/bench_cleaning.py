@@ -0,0 +1,95 @@
+""" Throughput benchmark of ingredient cleaning
+
+Cleans a list of ingredient strings one TextBlob at a time, the way Recipe.cleaning used to, and then in
+batches through Recipe.parsebatch, checks that both give identical results and reports strings per second.
+The memo of cleaned ingredients is not used, so only parsing and tagging are measured
+
+Usage:
+    python benchmarks/bench_cleaning.py [INGREDIENTS_FILE] [--batch N] [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from textblob import TextBlob as tb
+from foodscrape.scraping import Recipe
+
+# GLOBAL sample of ingredient strings used when no file is given
+SAMPLE = [
+    '1 cup white sugar',
+    '2 eggs',
+    '1/2 cup butter, softened',
+    '2 teaspoons vanilla extract',
+    '1 1/2 cups all purpose flour',
+    '1 (8 ounce) package cream cheese, softened',
+    '3 tablespoons olive oil',
+    '1 pinch salt',
+    '2 cloves garlic, minced',
+    '1 large onion, chopped',
+    '1/4 cup warm water',
+    '1 teaspoon baking soda',
+    'vegetable oil for frying',
+    '2 egg whites, stiffly beaten',
+    '1 (14.5 ounce) can diced tomatoes',
+    'salt and ground black pepper to taste'
+]
+
+def single(recipe,ings):
+    """ This function cleans every string with its own TextBlob, as Recipe.cleaning did before batching
+
+    Parameters:
+        :recipe: Recipe; holds the recipe whose stripkeys and choosebase are used
+        :ings: list; holds the ingredient strings
+    """
+    return [recipe.choosebase(tb(recipe.stripkeys(ing)).tags) for ing in ings]
+
+def batched(recipe,ings,size):
+    """ This function cleans the strings in batches of the given size
+
+    Parameters:
+        :recipe: Recipe; holds the recipe whose parsebatch is used
+        :ings: list; holds the ingredient strings
+        :size: int; holds the number of strings per batch
+    """
+    out = []
+    for n in range(0,len(ings),size):
+        out.extend(recipe.parsebatch(ings[n:n+size]))
+    return out
+
+def best(func,repeat):
+    """ This function returns the best time in seconds over repeat calls of func, along with its result
+    """
+    t = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        out = func()
+        t = min(t,time.perf_counter() - start)
+    return t,out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ingredients',nargs='?',help='file of ingredient strings, one per line')
+    parser.add_argument('--batch',type=int,default=512,help='strings per batch')
+    parser.add_argument('--repeat',type=int,default=3,help='runs per path, the best is kept')
+    args = parser.parse_args()
+
+    if args.ingredients:
+        with open(args.ingredients) as f:
+            ings = [line.strip() for line in f if line.strip()]
+    else:
+        ings = SAMPLE*64
+
+    # cleaning needs no page, so skip __init__ entirely
+    recipe = Recipe.__new__(Recipe)
+    t_single,out_single = best(lambda: single(recipe,ings),args.repeat)
+    t_batch,out_batch = best(lambda: batched(recipe,ings,args.batch),args.repeat)
+
+    print('strings: {}  identical: {}'.format(len(ings),out_single == out_batch))
+    print('single:  {:10.1f} strings/s'.format(len(ings)/t_single))
+    print('batched: {:10.1f} strings/s  (batch {})'.format(len(ings)/t_batch,args.batch))
+    print('speedup: {:.1f}x'.format(t_single/t_batch))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+""" Per-page benchmark of Recipe extraction
+
+Times the BeautifulSoup extraction path against the fast json-ld/XPath path over a directory of saved recipe
+pages and reports how often both paths agree. Cleaning is replaced by the identity so that only parsing and
+extraction are measured, unless --clean is given
+
+Usage:
+    python benchmarks/bench_recipe.py PAGES_DIR [--repeat N] [--clean]
+"""
+import os
+import sys
+import time
+import argparse
+from statistics import mean, median
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from foodscrape.scraping import Recipe
+
+class ParseOnly(Recipe):
+    """ Recipe whose cleaning step returns the ingredient strings untouched
+    """
+    def cleanbatch(self,ings):
+        return list(ings)
+
+def timepage(cls,url,html,fast,repeat):
+    """ This function times the extraction of one page
+
+    Returns the best time in seconds over repeat runs and the extracted recipe
+
+    Parameters:
+        :cls: class; holds Recipe or a subclass of it
+        :url: str; holds the url recorded for the page
+        :html: bytes; holds the page html
+        :fast: bool; selects the fast extraction path
+        :repeat: int; holds the number of runs
+    """
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        r = cls(url,fast=fast,html=html)
+        best = min(best,time.perf_counter() - start)
+    return best,r
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages',help='directory of saved recipe pages (*.html)')
+    parser.add_argument('--repeat',type=int,default=3,help='runs per page, the best is kept')
+    parser.add_argument('--clean',action='store_true',help='include ingredient cleaning in the timings')
+    args = parser.parse_args()
+
+    cls = Recipe if args.clean else ParseOnly
+    full,fast,agree = [],[],0
+    files = sorted(f for f in os.listdir(args.pages) if f.endswith('.html'))
+    for name in files:
+        with open(os.path.join(args.pages,name),'rb') as f:
+            html = f.read()
+        t_full,r_full = timepage(cls,name,html,False,args.repeat)
+        t_fast,r_fast = timepage(cls,name,html,True,args.repeat)
+        full.append(t_full)
+        fast.append(t_fast)
+        same = (r_full.name,r_full.rating,r_full.ingredients) == (r_fast.name,r_fast.rating,r_fast.ingredients)
+        agree += same
+        print('{:<40} full {:8.2f} ms  fast {:8.2f} ms  {}'.format(name[:40],t_full*1e3,t_fast*1e3,'same' if same else 'DIFF'))
+
+    if files:
+        print('\npages: {}  agreeing: {}'.format(len(files),agree))
+        print('full: mean {:.2f} ms  median {:.2f} ms'.format(mean(full)*1e3,median(full)*1e3))
+        print('fast: mean {:.2f} ms  median {:.2f} ms'.format(mean(fast)*1e3,median(fast)*1e3))
+        print('speedup: {:.1f}x'.format(sum(full)/sum(fast)))
+
+if __name__ == '__main__':
+    main()
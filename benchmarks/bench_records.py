@@ -0,0 +1,67 @@
+""" IPC benchmark of Recipe objects against RecipeRecord
+
+Extracts recipes from a directory of saved recipe pages, then measures what sending them from a worker to the
+parent costs: pickled bytes, pickle plus unpickle time, and the memory the parent holds after unpickling
+--copies results, for full Recipe objects and for the compact records workers now return
+
+Usage:
+    python benchmarks/bench_records.py PAGES_DIR [--copies N]
+"""
+import os
+import sys
+import time
+import pickle
+import argparse
+import tracemalloc
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from foodscrape.scraping import Recipe, RecipeRecord
+
+def measure(objs,copies):
+    """ This function measures the transfer cost of a list of objects
+
+    Returns pickled bytes per object, microseconds per pickle and unpickle, and parent bytes per object held
+
+    Parameters:
+        :objs: list; holds the objects to send
+        :copies: int; holds the number of objects the parent holds in the memory measurement
+    """
+    blobs = [pickle.dumps(o,pickle.HIGHEST_PROTOCOL) for o in objs]
+    size = sum(len(b) for b in blobs)/len(blobs)
+
+    start = time.perf_counter()
+    for o in objs:
+        pickle.loads(pickle.dumps(o,pickle.HIGHEST_PROTOCOL))
+    roundtrip = (time.perf_counter() - start)/len(objs)
+
+    tracemalloc.start()
+    held = [pickle.loads(blobs[i % len(blobs)]) for i in range(copies)]
+    memory = tracemalloc.get_traced_memory()[0]/copies
+    tracemalloc.stop()
+    del held
+    return size,roundtrip*1e6,memory
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages',help='directory of saved recipe pages (*.html)')
+    parser.add_argument('--copies',type=int,default=10000,help='results held by the parent in the memory measurement')
+    args = parser.parse_args()
+
+    recipes = []
+    for name in sorted(f for f in os.listdir(args.pages) if f.endswith('.html')):
+        with open(os.path.join(args.pages,name),'rb') as f:
+            r = Recipe(name,html=f.read())
+        if not r.geterr():
+            recipes.append(r)
+    if not recipes:
+        print('no recipe extracted without error')
+        return
+    records = [RecipeRecord.fromrecipe(r) for r in recipes]
+
+    print('recipes: {}  parent copies: {}'.format(len(recipes),args.copies))
+    print('{:<14}{:>14}{:>18}{:>18}'.format('','bytes/pickle','us/round trip','parent bytes/obj'))
+    for label,objs in (('Recipe',recipes),('RecipeRecord',records)):
+        print('{:<14}{:>14.0f}{:>18.1f}{:>18.0f}'.format(label,*measure(objs,args.copies)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+""" Request scheduler under injected latency and errors
+
+Starts the local stand-in with the given latency and 429/5xx rates, sends requests through a RequestScheduler
+from a pool of threads and reports throughput, latency percentiles, retries, failures and the concurrency limit
+the scheduler settled on
+
+Usage:
+    python benchmarks/bench_scheduler.py [--requests N] [--threads N] [--latency S] [--throttle P] [--fail P]
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from standin import StandIn
+from foodscrape.scheduler import RequestScheduler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests',type=int,default=500)
+    parser.add_argument('--threads',type=int,default=32)
+    parser.add_argument('--rate',type=float,default=200.0,help='requests per second allowed to the host')
+    parser.add_argument('--latency',type=float,default=0.02)
+    parser.add_argument('--jitter',type=float,default=0.02)
+    parser.add_argument('--throttle',type=float,default=0.05,help='fraction of 429 answers')
+    parser.add_argument('--fail',type=float,default=0.05,help='fraction of 503 answers')
+    args = parser.parse_args()
+
+    with StandIn(latency=args.latency,jitter=args.jitter,throttle=args.throttle,fail=args.fail) as server:
+        sched = RequestScheduler(rate=args.rate,burst=args.threads,backoff=(0.05,1.0))
+
+        def timed(i):
+            start = time.perf_counter()
+            r = sched.get(server.url + '/')
+            return time.perf_counter() - start,r.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as ex:
+            results = list(ex.map(timed,range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(t for t,status in results)
+    ok = sum(status == 200 for t,status in results)
+    pct = lambda p: latencies[min(len(latencies)-1,int(p*len(latencies)))]*1e3
+    print('requests: {}  ok: {}  {:.1f} req/s'.format(args.requests,ok,args.requests/elapsed))
+    print('latency ms: p50 {:.1f}  p90 {:.1f}  p99 {:.1f}'.format(pct(0.5),pct(0.9),pct(0.99)))
+    print('scheduler: {}  final limit {:.1f}'.format(sched.stats,sched.limit(server.url)))
+    print('server answers: {}'.format(server.hits))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+""" Latency benchmark of the recipe similarity index
+
+Generates a synthetic corpus of recipes, ingredients drawn from a Zipf-like vocabulary and random nutrition, and
+measures building, saving, loading and incrementally updating a SimilarityIndex, then the latency percentiles of
+ingredient searches and recipe lookalikes under both metrics, with and without a nutrition filter. A brute-force
+scan of the whole one-hot matrix per query, how the service answered queries before, is timed for comparison
+
+Usage:
+    python benchmarks/bench_similarity.py [--recipes N] [--vocab N] [--queries N] [--k N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+from scipy.sparse import csr_matrix
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from foodscrape.scraping import NUTRIENTS
+from foodscrape.similarity import SimilarityIndex
+
+def corpus(recipes,vocab,seed=0):
+    """ This function generates a synthetic recipe corpus
+
+    Returns the list of keys, the list of ingredient sets and the float32 nutrition block of every recipe
+
+    Parameters:
+        :recipes: int; holds the number of recipes
+        :vocab: int; holds the number of distinct ingredients
+        :seed: int; holds the seed of the generator
+    """
+    rng = np.random.default_rng(seed)
+    weights = 1/np.arange(1,vocab+1)
+    weights /= weights.sum()
+    sizes = rng.integers(5,16,recipes)
+    drawn = rng.choice(vocab,int(sizes.sum()),p=weights)
+    ings,start = [],0
+    for size in sizes:
+        ings.append({'ingredient{}'.format(n) for n in drawn[start:start+size]})
+        start += size
+    nutrition = rng.gamma(2.0,50.0,(recipes,len(NUTRIENTS))).astype(np.float32)
+    nutrition[rng.random(nutrition.shape) < 0.1] = np.nan
+    keys = ['https://www.allrecipes.com/recipe/{}/'.format(n) for n in range(recipes)]
+    return keys,ings,nutrition
+
+def percentiles(latencies):
+    """ This function returns the p50, p90 and p99 of a list of seconds, in milliseconds
+
+    Parameter:
+        :latencies: list; holds the seconds taken by each query
+    """
+    return tuple(np.percentile(np.asarray(latencies)*1e3,[50,90,99]))
+
+def timeach(func,args):
+    """ This function calls func on every argument, returning the seconds taken by each call
+
+    Parameters:
+        :func: function; holds the function to time
+        :args: list; holds the argument of each call
+    """
+    out = []
+    for arg in args:
+        start = time.perf_counter()
+        func(arg)
+        out.append(time.perf_counter() - start)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes',type=int,default=100000)
+    parser.add_argument('--vocab',type=int,default=5000,help='distinct ingredients')
+    parser.add_argument('--queries',type=int,default=200)
+    parser.add_argument('--k',type=int,default=10)
+    parser.add_argument('--update',type=int,default=1000,help='recipes added incrementally')
+    args = parser.parse_args()
+
+    keys,ings,nutrition = corpus(args.recipes + args.update,args.vocab)
+    base = args.recipes
+    rng = np.random.default_rng(1)
+    probes = [keys[n] for n in rng.integers(0,base,args.queries)]
+    searches = [set(list(ings[n])[:4]) for n in rng.integers(0,base,args.queries)]
+    name = NUTRIENTS[0]
+    bounds = {name:(0.0,float(np.nanpercentile(nutrition[:,0],25)))}
+
+    print('recipes: {}  vocabulary: {}  queries: {}  k: {}'.format(base,args.vocab,args.queries,args.k))
+    start = time.perf_counter()
+    index = SimilarityIndex()
+    index.add(keys[:base],ings[:base],nutrition[:base])
+    index.invert()
+    print('{:<28}{:>10.1f} ms'.format('build',(time.perf_counter() - start)*1e3))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        index.save(tmp)
+        print('{:<28}{:>10.1f} ms'.format('save',(time.perf_counter() - start)*1e3))
+        start = time.perf_counter()
+        index = SimilarityIndex.load(tmp)
+        index.invert()
+        print('{:<28}{:>10.1f} ms'.format('load',(time.perf_counter() - start)*1e3))
+
+    start = time.perf_counter()
+    index.add(keys[base:],ings[base:],nutrition[base:])
+    index.invert()
+    print('{:<28}{:>10.1f} ms'.format('add {} and reinvert'.format(args.update),(time.perf_counter() - start)*1e3))
+
+    print('{:<28}{:>10}{:>10}{:>10}'.format('query','p50 ms','p90 ms','p99 ms'))
+    cases = [
+        ('search dot',lambda q: index.search(q,args.k,'dot'),searches),
+        ('search jaccard',lambda q: index.search(q,args.k,'jaccard'),searches),
+        ('search jaccard filtered',lambda q: index.search(q,args.k,'jaccard',bounds),searches),
+        ('similar dot',lambda key: index.similar(key,args.k,'dot'),probes),
+        ('similar jaccard',lambda key: index.similar(key,args.k,'jaccard'),probes),
+        ('similar jaccard filtered',lambda key: index.similar(key,args.k,'jaccard',bounds),probes)
+    ]
+    for label,func,queries in cases:
+        print('{:<28}{:>10.3f}{:>10.3f}{:>10.3f}'.format(label,*percentiles(timeach(func,queries))))
+
+    # brute force: score every recipe of the one-hot matrix against the query vector
+    ids = {'ingredient{}'.format(n):n for n in range(args.vocab)}
+    rows = [[ids[i] for i in r] for r in ings]
+    indptr = np.cumsum([0] + [len(r) for r in rows])
+    onehot = csr_matrix((np.ones(indptr[-1],np.float32),np.concatenate(rows),indptr),shape=(len(rows),args.vocab))
+    def scan(q):
+        vec = np.zeros(args.vocab,np.float32)
+        vec[[ids[i] for i in q]] = 1
+        scores = onehot @ vec
+        return np.argsort(-scores)[:args.k]
+    print('{:<28}{:>10.3f}{:>10.3f}{:>10.3f}'.format('brute-force scan dot',*percentiles(timeach(scan,searches))))
+
+if __name__ == '__main__':
+    main()
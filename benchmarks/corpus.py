@@ -0,0 +1,244 @@
+""" Fixture corpus of category and recipe pages
+
+Either generates a deterministic synthetic corpus shaped like allrecipes.com, with the markup every extractor
+looks for, or loads a corpus saved to a directory. A saved corpus is a directory holding a manifest.json that
+maps url paths to page files; --save writes a generated corpus in that layout, and pages recorded from the real
+site can be dropped in the same way. Links are written against https://www.allrecipes.com and rewritten to the
+stand-in's base url when served
+
+Usage:
+    python benchmarks/corpus.py DIR [--recipes N] [--fanout N] [--seed N]
+"""
+import os
+import json
+import random
+import argparse
+
+# GLOBAL constant for the site prefix links are written against
+SITE = 'https://www.allrecipes.com'
+
+# GLOBAL sample of ingredient strings the synthetic recipes draw from
+INGREDIENTS = [
+    '{} cup white sugar',
+    '{} eggs',
+    '{} cup butter, softened',
+    '{} teaspoons vanilla extract',
+    '{} cups all purpose flour',
+    '1 (8 ounce) package cream cheese, softened',
+    '{} tablespoons olive oil',
+    '1 pinch salt',
+    '{} cloves garlic, minced',
+    '1 large onion, chopped',
+    '{} cup warm water',
+    '{} teaspoon baking soda',
+    'vegetable oil for frying',
+    '{} egg whites, stiffly beaten',
+    '1 (14.5 ounce) can diced tomatoes',
+    'salt and ground black pepper to taste',
+    '{} cups chicken broth',
+    '{} pounds skinless, boneless chicken breast halves',
+    '{} cup grated Parmesan cheese',
+    '{} cup heavy whipping cream',
+    '{} teaspoon ground cinnamon',
+    '{} cup packed brown sugar',
+    '{} cups milk',
+    '{} tablespoon lemon juice',
+    '{} cup chopped walnuts',
+    '{} green bell pepper, diced',
+    '{} cup uncooked white rice',
+    '{} teaspoon dried oregano',
+    '{} (16 ounce) package spaghetti',
+    '{} cup sour cream'
+]
+
+# GLOBAL quantities substituted into ingredient strings, some with the non-ascii fractions found on real pages
+QUANTITIES = ['1','2','3','½','¼','1 ½','⅓','¾']
+
+# GLOBAL nutrition names as listed on recipe pages with the unit and range of their synthetic values
+NUTRITION = [
+    ('protein','g',(1,60)),
+    ('carbohydrates','g',(1,120)),
+    ('dietary fiber','g',(0,15)),
+    ('sugars','g',(0,80)),
+    ('fat','g',(1,70)),
+    ('saturated fat','g',(0,30)),
+    ('cholesterol','mg',(0,300)),
+    ('vitamin a iu','IU',(0,5000)),
+    ('niacin equivalents','mg',(0,30)),
+    ('vitamin b6','mg',(0,2)),
+    ('vitamin c','mg',(0,90)),
+    ('folate','mcg',(0,400)),
+    ('calcium','mg',(0,600)),
+    ('iron','mg',(0,10)),
+    ('magnesium','mg',(0,150)),
+    ('potassium','mg',(0,1200)),
+    ('sodium','mg',(0,2500)),
+    ('thiamin','mg',(0,1)),
+    ('calories from fat','',(0,600))
+]
+
+def category(names,links):
+    """ This function renders a category page with a carousel of subcategories
+
+    Parameters:
+        :names: list; holds the subcategory names
+        :links: list; holds the subcategory urls
+    """
+    items = ''.join(
+        '<a class="carouselNav__link recipeCarousel__link" href="{}"><div class="carouselNav__linkText">{}</div></a>'
+        .format(link,name) for name,link in zip(names,links))
+    return '<html><head><title>Recipes</title></head><body><nav>{}</nav></body></html>'.format(items)
+
+def cards(links):
+    """ This function renders a category page listing recipe cards
+
+    Parameter:
+        :links: list; holds the recipe urls
+    """
+    items = ''.join(
+        '<div class="card"><a class="card__titleLink manual-link-behavior" href="{}">Recipe</a></div>'.format(link)
+        for link in links)
+    return '<html><head><title>Recipes</title></head><body><main>{}</main></body></html>'.format(items)
+
+def recipe(rng,num,ldjson):
+    """ This function renders a recipe page
+
+    Parameters:
+        :rng: Random; holds the random generator
+        :num: int; holds the recipe number
+        :ldjson: bool; if True, also embeds the recipe as json-ld
+    """
+    name = 'Synthetic Recipe {}'.format(num)
+    rating = round(rng.uniform(1,5),2)
+    ings = [i.format(rng.choice(QUANTITIES)) for i in rng.sample(INGREDIENTS,rng.randint(4,12))]
+    nutri = [(n,'{:.1f}{}'.format(rng.uniform(*bounds),unit)) for n,unit,bounds in NUTRITION]
+
+    head = ''
+    if ldjson:
+        data = {
+            '@context':'http://schema.org',
+            '@type':'Recipe',
+            'name':name,
+            'aggregateRating':{'@type':'AggregateRating','ratingValue':str(rating)},
+            'recipeIngredient':ings,
+            'nutrition':{
+                '@type':'NutritionInformation',
+                'fatContent':nutri[4][1],
+                'saturatedFatContent':nutri[5][1],
+                'cholesterolContent':nutri[6][1],
+                'sodiumContent':nutri[16][1],
+                'carbohydrateContent':nutri[1][1],
+                'fiberContent':nutri[2][1],
+                'proteinContent':nutri[0][1],
+                'sugarContent':nutri[3][1]
+            }
+        }
+        head = '<script type="application/ld+json">{}</script>'.format(json.dumps([data]))
+
+    body = (
+        '<h1 class="headline heading-content">{}</h1>'
+        '<div class="recipe-ratings" data-ratings-average="{}"></div>'
+        '<ul>{}</ul><div class="nutrition">{}</div>'
+    ).format(
+        name,
+        rating,
+        ''.join('<li><span class="ingredients-item-name">{}</span></li>'.format(i) for i in ings),
+        ''.join('<span class="nutrient-name">{}: <span class="nutrient-value">{}</span></span>'.format(n,v) for n,v in nutri)
+    )
+    # pad the page with markup the extractors skip, real pages are mostly navigation, ads and scripts
+    filler = '<div class="ad"><p>{}</p></div>'.format('lorem ipsum ' * 40) * 30
+    return '<html><head><title>{}</title>{}</head><body>{}{}</body></html>'.format(name,head,body,filler)
+
+def generate(recipes=200,fanout=4,perpage=20,ldjson=0.5,seed=0):
+    """ This function generates a synthetic corpus
+
+    Returns a dict from url path to page bytes: a root category at /recipes/, a tree of subcategories with fanout
+    children each, and leaf categories listing perpage recipe cards until recipes recipes are listed
+
+    Parameters:
+        :recipes: int; holds the number of recipe pages
+        :fanout: int; holds the number of subcategories per category
+        :perpage: int; holds the number of recipe cards per leaf category
+        :ldjson: float; holds the fraction of recipes that embed json-ld
+        :seed: int; holds the random seed
+    """
+    rng = random.Random(seed)
+    pages = {}
+    recipe_paths = ['/recipe/{}/synthetic-recipe-{}/'.format(10000+n,n) for n in range(recipes)]
+    for n,path in enumerate(recipe_paths):
+        pages[path] = recipe(rng,n,rng.random() < ldjson).encode('utf-8')
+
+    # leaf categories each list a slice of the recipes
+    leaves = ['/recipes/{}/leaf-{}/'.format(100+n,n) for n in range(0,max(1,-(-recipes//perpage)))]
+    for n,path in enumerate(leaves):
+        pages[path] = cards([SITE + p for p in recipe_paths[n*perpage:(n+1)*perpage]]).encode('utf-8')
+
+    # build parent categories bottom-up until a single root remains
+    level,depth = leaves,0
+    while len(level) > 1:
+        depth += 1
+        parents = []
+        for n in range(0,len(level),fanout):
+            children = level[n:n+fanout]
+            path = '/recipes/{}/level-{}-{}/'.format(1000*depth+n,depth,n)
+            names = ['Category {}'.format(c.strip('/').split('/')[-1]) for c in children]
+            pages[path] = category(names,[SITE + c for c in children]).encode('utf-8')
+            parents.append(path)
+        level = parents
+    top = level[0]
+    pages['/recipes/'] = category(['Category root'],[SITE + top]).encode('utf-8')
+    return pages
+
+def save(pages,directory):
+    """ This function saves a corpus with a manifest.json mapping url paths to page files
+
+    Parameters:
+        :pages: dict; holds page bytes by url path
+        :directory: str; holds the corpus directory
+    """
+    os.makedirs(directory,exist_ok=True)
+    manifest = {}
+    for n,(path,page) in enumerate(sorted(pages.items())):
+        name = '{:06d}.html'.format(n)
+        with open(os.path.join(directory,name),'wb') as f:
+            f.write(page)
+        manifest[path] = name
+    with open(os.path.join(directory,'manifest.json'),'w') as f:
+        json.dump(manifest,f,indent=1)
+
+def load(directory):
+    """ This function loads a corpus saved by save
+
+    Parameter:
+        :directory: str; holds the corpus directory
+    """
+    with open(os.path.join(directory,'manifest.json')) as f:
+        manifest = json.load(f)
+    pages = {}
+    for path,name in manifest.items():
+        with open(os.path.join(directory,name),'rb') as f:
+            pages[path] = f.read()
+    return pages
+
+def rebase(pages,base):
+    """ This function rewrites the site prefix of every link to a new base url
+
+    Parameters:
+        :pages: dict; holds page bytes by url path
+        :base: str; holds the base url of the stand-in
+    """
+    return {path:page.replace(SITE.encode(),base.encode()) for path,page in pages.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory',help='directory to save the generated corpus to')
+    parser.add_argument('--recipes',type=int,default=200)
+    parser.add_argument('--fanout',type=int,default=4)
+    parser.add_argument('--seed',type=int,default=0)
+    args = parser.parse_args()
+    pages = generate(args.recipes,args.fanout,seed=args.seed)
+    save(pages,args.directory)
+    print('saved {} pages to {}'.format(len(pages),args.directory))
+
+if __name__ == '__main__':
+    main()
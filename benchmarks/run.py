@@ -0,0 +1,267 @@
+""" Offline benchmark suite
+
+Serves a fixture corpus from the local stand-in and measures every stage of the scraper on it, separately and end
+to end: makesoup, the recursive and breadth-first AllRecipeBook crawls, Recipe extraction on both paths,
+ingredient cleaning, makeFrame, encode, excel_export and to_excel. Results are written as json, with pages or
+items per second and latency percentiles per stage, so runs can be compared across commits with --compare
+
+Usage:
+    python benchmarks/run.py [--corpus DIR] [--recipes N] [--latency S] [--stages a,b] [--out FILE] [--compare FILE]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,os.path.join(HERE,'..'))
+import corpus
+from standin import StandIn
+from foodscrape import scraping
+from foodscrape import encoding
+
+# GLOBAL constant for a request rate high enough that the scheduler never throttles the stand-in
+UNLIMITED = 1e6
+
+def summarize(items,seconds,latencies=None):
+    """ This function summarizes the timings of a stage
+
+    Returns a dict of the item count, total seconds, items per second and, when per item latencies were recorded,
+    their percentiles in milliseconds
+
+    Parameters:
+        :items: int; holds the number of pages or items processed
+        :seconds: float; holds the wall time of the stage
+        :latencies: list; holds the seconds taken by each item, None if not measured per item
+    """
+    out = {'items':items,'seconds':round(seconds,6),'per_sec':round(items/seconds,3) if seconds else None}
+    if latencies:
+        latencies = sorted(latencies)
+        pct = lambda p: round(latencies[min(len(latencies)-1,int(p*len(latencies)))]*1e3,3)
+        out.update({'p50_ms':pct(0.5),'p90_ms':pct(0.9),'p99_ms':pct(0.99),'max_ms':round(latencies[-1]*1e3,3)})
+    return out
+
+def timeach(func,args):
+    """ This function calls func on every argument, timing each call
+
+    Returns the total seconds, the list of per call seconds and the list of results
+
+    Parameters:
+        :func: function; holds the function to time
+        :args: list; holds the argument of each call
+    """
+    latencies,results = [],[]
+    start = time.perf_counter()
+    for arg in args:
+        t = time.perf_counter()
+        results.append(func(arg))
+        latencies.append(time.perf_counter() - t)
+    return time.perf_counter() - start,latencies,results
+
+def freshdir(ctx):
+    """ This function switches to an empty working directory, so every stage starts without links.txt or outputs
+
+    Parameter:
+        :ctx: dict; holds the benchmark context
+    """
+    work = tempfile.mkdtemp(prefix='foodbench',dir=ctx['tmp'])
+    os.makedirs(os.path.join(work,'data'))
+    os.chdir(work)
+
+class Stages:
+    """ The benchmarked stages, one method per stage, sharing a context dict
+
+    Attributes:
+        :ctx: dict; holds the stand-in, the corpus urls and results handed from stage to stage
+    """
+    def __init__(self,ctx):
+        self.ctx = ctx
+
+    def makesoup(self):
+        seconds,latencies,soups = timeach(scraping.makesoup,self.ctx['recipes'])
+        for soup in soups:
+            soup.decompose()
+        return summarize(len(latencies),seconds,latencies)
+
+    def crawl(self,workers=None):
+        freshdir(self.ctx)
+        server = self.ctx['server']
+        before = sum(server.hits.values())
+        start = time.perf_counter()
+        book = scraping.AllRecipeBook(scraping.ROOT_URL,self.ctx['quant'],workers)
+        seconds = time.perf_counter() - start
+        out = summarize(sum(server.hits.values()) - before,seconds)
+        out['links'] = len(book.linklist)
+        return out
+
+    def crawl_bfs(self):
+        return self.crawl(scraping.DEFAULT_WORKERS)
+
+    def extract(self,fast=False):
+        pages = [(url,self.ctx['html'][url]) for url in self.ctx['recipes']]
+        seconds,latencies,recipes = timeach(lambda p: scraping.Recipe(p[0],fast=fast,html=p[1]),pages)
+        out = summarize(len(pages),seconds,latencies)
+        out['errors'] = sum(r.geterr() for r in recipes)
+        return out
+
+    def extract_fast(self):
+        return self.extract(True)
+
+    def cleaning(self):
+        # collect the normalized ingredient strings of every recipe, then clean them a recipe at a time
+        recipe = scraping.Recipe.__new__(scraping.Recipe)
+        batches = []
+        for url in self.ctx['recipes']:
+            tree = scraping.lxhtml.fromstring(self.ctx['html'][url])
+            ings = [scraping.xtext(s) for s in scraping.XSTUFF(tree)]
+            batches.append([i if i.isascii() else recipe.convertedstr(i) for i in ings])
+        scraping.use_memo(None)
+        seconds,latencies,bases = timeach(recipe.parsebatch,batches)
+        out = summarize(sum(len(b) for b in batches),seconds)
+        out.update({k:v for k,v in summarize(len(batches),seconds,latencies).items() if k.endswith('_ms')})
+        return out
+
+    def makeFrame(self):
+        freshdir(self.ctx)
+        start = time.perf_counter()
+        df = encoding.makeFrame(self.ctx['quant'],rate=UNLIMITED)
+        seconds = time.perf_counter() - start
+        self.ctx['df'] = df
+        return summarize(len(df),seconds)
+
+    def encode(self):
+        df = self.frame()
+        start = time.perf_counter()
+        self.ctx['encoded'] = encoding.encode(df)
+        return summarize(len(df),time.perf_counter() - start)
+
+    def encode_sparse(self):
+        df = self.frame()
+        start = time.perf_counter()
+        encoding.encode(df,sparse=True)
+        return summarize(len(df),time.perf_counter() - start)
+
+    def excel_export(self):
+        if 'encoded' not in self.ctx:
+            self.ctx['encoded'] = encoding.encode(self.frame())
+        df = self.ctx['encoded'].drop(columns=['Ingredients'])
+        freshdir(self.ctx)
+        start = time.perf_counter()
+        encoding.excel_export(df,'data/recipes.xlsx')
+        out = summarize(len(df),time.perf_counter() - start)
+        out['bytes'] = os.path.getsize('data/recipes.xlsx')
+        return out
+
+    def end_to_end(self):
+        freshdir(self.ctx)
+        start = time.perf_counter()
+        encoding.to_excel(self.ctx['quant'],rate=UNLIMITED)
+        return summarize(self.ctx['quant'],time.perf_counter() - start)
+
+    def frame(self):
+        """ This function returns the frame made by the makeFrame stage, making one if that stage was skipped
+        """
+        if 'df' not in self.ctx:
+            freshdir(self.ctx)
+            self.ctx['df'] = encoding.makeFrame(self.ctx['quant'],rate=UNLIMITED)
+        return self.ctx['df']
+
+# GLOBAL constant for every stage in the order they run
+STAGES = ['makesoup','crawl','crawl_bfs','extract','extract_fast','cleaning','makeFrame','encode','encode_sparse',
+          'excel_export','end_to_end']
+
+def commit():
+    """ This function returns the current git commit of the repository, None outside a git checkout
+    """
+    try:
+        return subprocess.run(['git','rev-parse','--short','HEAD'],cwd=HERE,capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def compare(old,new):
+    """ This function prints the per stage throughput of two result files side by side
+
+    Parameters:
+        :old: dict; holds the earlier results
+        :new: dict; holds the later results
+    """
+    print('{:<14}{:>14}{:>14}{:>10}'.format('stage','old/s','new/s','ratio'))
+    for stage in STAGES:
+        a = old['stages'].get(stage,{}).get('per_sec')
+        b = new['stages'].get(stage,{}).get('per_sec')
+        if a and b:
+            print('{:<14}{:>14.2f}{:>14.2f}{:>9.2f}x'.format(stage,a,b,b/a))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus',help='saved corpus directory, a synthetic corpus is generated if not given')
+    parser.add_argument('--recipes',type=int,default=200,help='recipes in the synthetic corpus')
+    parser.add_argument('--quant',type=int,help='recipes to crawl and scrape, every corpus recipe by default')
+    parser.add_argument('--latency',type=float,default=0.0,help='seconds the stand-in delays every answer')
+    parser.add_argument('--stages',help='comma separated stages to run, all by default: ' + ','.join(STAGES))
+    parser.add_argument('--out',help='json file to write results to, stdout by default')
+    parser.add_argument('--compare',help='earlier json results to compare against')
+    args = parser.parse_args()
+
+    pages = corpus.load(args.corpus) if args.corpus else corpus.generate(args.recipes)
+    stages = args.stages.split(',') if args.stages else STAGES
+    unknown = set(stages).difference(STAGES)
+    if unknown:
+        parser.error('unknown stages: ' + ', '.join(sorted(unknown)))
+
+    tmp = tempfile.mkdtemp(prefix='foodbench')
+    cwd = os.getcwd()
+    results = {
+        'commit':commit(),
+        'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python':platform.python_version(),
+        'machine':platform.machine(),
+        'cpus':os.cpu_count(),
+        'params':{'corpus':args.corpus,'pages':len(pages),'latency':args.latency},
+        'stages':{}
+    }
+    try:
+        with StandIn(latency=args.latency) as server:
+            server.pages = corpus.rebase(pages,server.url)
+            recipes = [server.url + p for p in sorted(pages) if p.startswith('/recipe/')]
+            quant = args.quant or len(recipes)
+            results['params']['quant'] = quant
+            scraping.ROOT_URL = server.url + '/recipes/'
+            scraping.use_cache(None)
+            scraping.use_scheduler(rate=UNLIMITED,burst=1000)
+
+            ctx = {
+                'server':server,
+                'tmp':tmp,
+                'quant':quant,
+                'recipes':recipes[:quant],
+                'html':{server.url + p:page for p,page in server.pages.items()}
+            }
+            bench = Stages(ctx)
+            for stage in stages:
+                print('running {}...'.format(stage),file=sys.stderr)
+                try:
+                    results['stages'][stage] = getattr(bench,stage)()
+                except Exception as e:
+                    results['stages'][stage] = {'error':'{}: {}'.format(type(e).__name__,e)}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp,ignore_errors=True)
+
+    text = json.dumps(results,indent=2)
+    if args.out:
+        with open(args.out,'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f),results)
+
+if __name__ == '__main__':
+    main()
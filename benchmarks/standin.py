@@ -0,0 +1,136 @@
+""" Local stand-in for allrecipes.com
+
+A threaded HTTP server on localhost that serves a dict of pages by path and can inject faults: a fixed latency
+with random jitter, a fraction of 429 (with Retry-After) and 5xx answers, and a fraction of bodies cut short. Used to exercise the request
+scheduler, and the benchmarks, without touching the network
+
+Usage:
+    python benchmarks/standin.py [--port N] [--latency S] [--jitter S] [--throttle P] [--fail P] [--truncate P]
+"""
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StandIn:
+    """ Fault injecting local HTTP server
+
+    Attributes:
+        :pages: dict; holds the page bytes served for each path, paths not in it get a 404
+        :latency: float; holds the seconds every answer is delayed by
+        :jitter: float; holds the maximum extra random delay in seconds
+        :throttle: float; holds the fraction of requests answered 429 with a Retry-After
+        :fail: float; holds the fraction of requests answered 503
+        :truncate: float; holds the fraction of requests whose body is cut short before the connection closes
+        :retry_after: float; holds the Retry-After seconds sent with 429 answers
+        :hits: dict; holds counts of answers by status code
+        :url: str; holds the base url of the running server
+
+    Methods:
+        :start: starts serving on a background thread
+        :stop: shuts the server down
+    """
+    def __init__(self,pages=None,port=0,latency=0.0,jitter=0.0,throttle=0.0,fail=0.0,truncate=0.0,retry_after=0.1):
+        self.pages = pages if pages is not None else {'/':b'<html><body>stand-in</body></html>'}
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.fail = fail
+        self.truncate = truncate
+        self.retry_after = retry_after
+        self.hits = {}
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(('127.0.0.1',port),self.handler())
+        self.__server.daemon_threads = True
+        self.__thread = None
+        self.url = 'http://127.0.0.1:{}'.format(self.__server.server_address[1])
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*exc):
+        self.stop()
+
+    def handler(self):
+        """ This function returns the request handler class bound to this server
+        """
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(standin.latency + random.uniform(0,standin.jitter))
+                roll = random.random()
+                headers = {}
+                if roll < standin.throttle:
+                    status,body = 429,b'slow down'
+                    headers['Retry-After'] = str(standin.retry_after)
+                elif roll < standin.throttle + standin.fail:
+                    status,body = 503,b'unavailable'
+                elif self.path in standin.pages:
+                    status,body = 200,standin.pages[self.path]
+                else:
+                    status,body = 404,b'not found'
+                standin.record(status)
+                # promise the whole body but send half of it and hang up
+                cut = roll >= 1 - standin.truncate
+
+                self.send_response(status)
+                for key,val in headers.items():
+                    self.send_header(key,val)
+                self.send_header('Content-Type','text/html; charset=utf-8')
+                self.send_header('Content-Length',str(len(body)))
+                self.end_headers()
+                self.wfile.write(body[:len(body)//2] if cut else body)
+                if cut:
+                    self.close_connection = True
+
+            def log_message(self,*args):
+                pass
+
+        return Handler
+
+    def record(self,status):
+        """ This function counts an answer by status code
+
+        Parameter:
+            :status: int; holds the status code
+        """
+        with self.__lock:
+            self.hits[status] = self.hits.get(status,0) + 1
+
+    def start(self):
+        """ This function starts serving on a daemon thread and returns the server
+        """
+        self.__thread = threading.Thread(target=self.__server.serve_forever,daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """ This function shuts the server down
+        """
+        self.__server.shutdown()
+        self.__server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port',type=int,default=8000)
+    parser.add_argument('--latency',type=float,default=0.0)
+    parser.add_argument('--jitter',type=float,default=0.0)
+    parser.add_argument('--throttle',type=float,default=0.0)
+    parser.add_argument('--fail',type=float,default=0.0)
+    parser.add_argument('--truncate',type=float,default=0.0)
+    args = parser.parse_args()
+
+    server = StandIn(port=args.port,latency=args.latency,jitter=args.jitter,throttle=args.throttle,fail=args.fail,
+                     truncate=args.truncate)
+    print('serving on {}'.format(server.url))
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import os
+import gzip
+import mmap
+import fcntl
+import time
+import threading
+
+# GLOBAL constant for the gzip level every record is compressed with
+LEVEL = 6
+
+class PageArchive:
+    """ Compressed, append-only archive of fetched pages
+
+    Pages are appended to a single file as WARC resource records, each its own gzip member, so the file reads as a
+    .warc.gz with standard tools and any record can be decompressed alone. Next to it an index file holds the
+    offset, compressed length and url of every record, one tab separated line per record; the latest record of a
+    url wins. Appends take an exclusive lock on the archive, and a thread lock around it since threads share the
+    process's file, so the worker processes of a Pool and the fetcher threads of a process can all record into the
+    same archive. Reads go through a memory map of the archive opened once per process
+
+    Attributes:
+        :path: str; holds the path of the archive file
+        :index: dict; holds the offset and length of the latest record of every url, as of the last load
+
+    Methods:
+        :add: appends a page
+        :get: returns the archived page of a url
+        :read: returns the page of the record at an offset
+        :load: brings the index up to date with records appended by other processes
+        :close: closes the archive
+    """
+    def __init__(self,path='data/pages.warc.gz'):
+        self.path = path
+        self.index = {}
+        self.__indexpath = path + '.idx'
+        self.__pid = None
+        self.__file = None
+        self.__map = None
+        self.__lock = threading.RLock()
+        self.load()
+
+    def __getstate__(self):
+        # file handles and maps cannot cross process boundaries, the receiving process opens its own
+        state = self.__dict__.copy()
+        state['_PageArchive__pid'] = None
+        state['_PageArchive__file'] = None
+        state['_PageArchive__map'] = None
+        state['_PageArchive__lock'] = None
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.__lock = threading.RLock()
+
+    def __contains__(self,url):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def open(self):
+        """ This function returns the archive file of the current process, opening it if needed
+        """
+        with self.__lock:
+            if self.__pid != os.getpid():
+                self.__file = open(self.path,'ab')
+                self.__map = None
+                self.__pid = os.getpid()
+            return self.__file
+
+    def load(self):
+        """ This function reads the index, under the archive lock
+
+        A partially written index line, or record bytes past the last indexed record, left by an interrupted append
+        are truncated
+        """
+        os.makedirs(os.path.dirname(self.path) or '.',exist_ok=True)
+        with self.__lock:
+            f = self.open()
+            fcntl.flock(f,fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(self.__indexpath):
+                    open(self.__indexpath,'a').close()
+                with open(self.__indexpath,'rb') as idx:
+                    raw = idx.read()
+                end = raw.rfind(b'\n') + 1
+                if end < len(raw):
+                    os.truncate(self.__indexpath,end)
+                last = 0
+                for line in raw[:end].decode('utf-8').splitlines():
+                    offset,length,url = line.split('\t',2)
+                    self.index[url] = (int(offset),int(length))
+                    last = max(last,int(offset) + int(length))
+                if os.path.getsize(self.path) > last:
+                    os.truncate(self.path,last)
+            finally:
+                fcntl.flock(f,fcntl.LOCK_UN)
+
+    def add(self,url,html):
+        """ This function appends a page to the archive
+
+        Parameters:
+            :url: str; contains webpage
+            :html: bytes; holds the page html
+        """
+        header = ('WARC/1.0\r\nWARC-Type: resource\r\nWARC-Target-URI: {}\r\nWARC-Date: {}\r\n'
+                  'Content-Type: text/html\r\nContent-Length: {}\r\n\r\n').format(
+            url,time.strftime('%Y-%m-%dT%H:%M:%SZ',time.gmtime()),len(html))
+        record = gzip.compress(header.encode('utf-8') + html + b'\r\n\r\n',compresslevel=LEVEL)
+        # flock does not exclude threads sharing the file, so threads take turns before taking it
+        with self.__lock:
+            f = self.open()
+            fcntl.flock(f,fcntl.LOCK_EX)
+            try:
+                f.seek(0,os.SEEK_END)
+                offset = f.tell()
+                f.write(record)
+                f.flush()
+                with open(self.__indexpath,'ab') as idx:
+                    idx.write('{}\t{}\t{}\n'.format(offset,len(record),url).encode('utf-8'))
+            finally:
+                fcntl.flock(f,fcntl.LOCK_UN)
+            self.index[url] = (offset,len(record))
+
+    def read(self,offset,length):
+        """ This function returns the page html of the record at an offset
+
+        Parameters:
+            :offset: int; holds the offset of the record
+            :length: int; holds the compressed length of the record
+        """
+        with self.__lock:
+            self.open()
+            if self.__map is None or offset + length > len(self.__map):
+                with open(self.path,'rb') as f:
+                    self.__map = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            raw = self.__map[offset:offset+length]
+        record = gzip.decompress(raw)
+        split = record.index(b'\r\n\r\n')
+        for line in record[:split].split(b'\r\n'):
+            if line.lower().startswith(b'content-length:'):
+                return record[split+4:split+4+int(line[15:])]
+        return record[split+4:-4]
+
+    def get(self,url):
+        """ This function returns the latest archived html of a url, None if it is not archived
+
+        Parameter:
+            :url: str; contains webpage
+        """
+        if url not in self.index:
+            return None
+        return self.read(*self.index[url])
+
+    def close(self):
+        """ This function closes the archive file and its map
+        """
+        if self.__map is not None:
+            self.__map.close()
+        if self.__file is not None:
+            self.__file.close()
+        self.__map = None
+        self.__file = None
+        self.__pid = None
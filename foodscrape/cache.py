@@ -0,0 +1,217 @@
+import os
+import time
+import sqlite3
+import threading
+import tempfile
+from hashlib import sha256
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# GLOBAL constant for the number of seconds a cached response is served without revalidation
+DEFAULT_TTL = 24*60*60
+
+# GLOBAL constant for the number of seconds an unused cached response is kept before eviction
+DEFAULT_MAX_AGE = 30*24*60*60
+
+# GLOBAL constant for the total size in bytes of cached responses before least recently used ones are evicted
+DEFAULT_MAX_BYTES = 2*1024**3
+
+# GLOBAL constant for the number of stores a process makes between eviction passes
+EVICT_EVERY = 100
+
+def normalize(url):
+    """ This function normalizes a url for use as a cache key
+
+    Returns the url with lowercased scheme and host, default ports and fragments dropped, an empty path
+    replaced by "/" and query parameters sorted
+
+    Parameter:
+        :url: str; contains webpage
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme,parts.port) not in (('http',80),('https',443)):
+        host = '{}:{}'.format(host,parts.port)
+    query = urlencode(sorted(parse_qsl(parts.query,keep_blank_values=True)))
+    return urlunsplit((scheme,host,parts.path or '/',query,''))
+
+class ResponseCache:
+    """ On-disk cache of HTTP response bodies
+
+    Bodies are stored content-addressed under objects/, named by their sha256 digest, so pages with identical
+    html share one file. An SQLite index maps every normalized url to its digest, validators and timestamps.
+    Each thread of each process opens its own connection and blobs are written atomically, so the cache is safe to
+    share between the worker processes of a Pool and the threads of a crawl
+
+    Attributes:
+        :directory: str; holds the root directory of the cache
+        :ttl: float; holds the seconds a response is served before it is revalidated
+        :max_age: float; holds the seconds an unused response is kept
+        :max_bytes: int; holds the total size of stored bodies before the least recently used are evicted
+
+    Methods:
+        :fetch: returns the body for a url, from the cache when fresh or revalidated
+        :evict: removes expired and least recently used responses
+    """
+    def __init__(self,directory='cache',ttl=DEFAULT_TTL,max_age=DEFAULT_MAX_AGE,max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.__objects = os.path.join(directory,'objects')
+        self.__local = threading.local()
+        self.__stores = 0
+        os.makedirs(self.__objects,exist_ok=True)
+        self.connect().execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL,
+                etag TEXT, modified TEXT, fetched REAL NOT NULL, used REAL NOT NULL)""")
+        self.connect().execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self.connect().execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+
+    def __getstate__(self):
+        # connections cannot cross process boundaries, the receiving process opens its own
+        state = self.__dict__.copy()
+        state['_ResponseCache__local'] = None
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.__local = threading.local()
+
+    def connect(self):
+        """ This function returns the SQLite connection of the current thread, opening it if needed
+
+        SQLite connections can only be used by the thread that opened them, so every thread has its own, and a
+        forked process never reuses the connection of the thread that forked it
+        """
+        local = self.__local
+        if getattr(local,'pid',None) != os.getpid():
+            local.conn = sqlite3.connect(os.path.join(self.directory,'index.sqlite'),timeout=60,isolation_level=None)
+            local.conn.execute("PRAGMA journal_mode=WAL")
+            local.pid = os.getpid()
+        return local.conn
+
+    def blobpath(self,digest):
+        """ This function returns the path of the stored body with the given digest
+
+        Parameter:
+            :digest: str; holds the hex sha256 digest of a body
+        """
+        return os.path.join(self.__objects,digest[:2],digest)
+
+    def fetch(self,url,get):
+        """ This function returns the body of the page at url
+
+        Fresh entries are served from disk. Stale entries are revalidated with a conditional request using the
+        stored ETag and Last-Modified validators, and a 304 answer serves the stored body. Anything else is
+        fetched in full and stored if the response was successful
+
+        Parameters:
+            :url: str; contains webpage
+            :get: function; performs a GET as get(url,headers=...) and returns a requests Response
+        """
+        key = normalize(url)
+        now = time.time()
+        row = self.connect().execute(
+            "SELECT digest,etag,modified,fetched FROM entries WHERE url=?",(key,)).fetchone()
+
+        headers = {}
+        if row:
+            digest,etag,modified,fetched = row
+            if now - fetched < self.ttl:
+                body = self.read(digest)
+                if body is not None:
+                    self.connect().execute("UPDATE entries SET used=? WHERE url=?",(now,key))
+                    return body
+            else:
+                if etag:
+                    headers['If-None-Match'] = etag
+                if modified:
+                    headers['If-Modified-Since'] = modified
+
+        r = get(url,headers=headers)
+        if r.status_code == 304 and row:
+            body = self.read(row[0])
+            if body is not None:
+                self.connect().execute("UPDATE entries SET fetched=?,used=? WHERE url=?",(now,now,key))
+                return body
+            # the body was evicted under us, fall back to an unconditional request
+            r = get(url,headers={})
+
+        if r.status_code == 200:
+            self.store(key,r,now)
+        return r.content
+
+    def read(self,digest):
+        """ This function returns a stored body, or None if it has been evicted
+
+        Parameter:
+            :digest: str; holds the hex sha256 digest of a body
+        """
+        try:
+            with open(self.blobpath(digest),'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self,key,r,now):
+        """ This function stores a successful response under the normalized url key
+
+        Parameters:
+            :key: str; holds the normalized url
+            :r: Response; holds the response to store
+            :now: float; holds the time the response was fetched
+        """
+        body = r.content
+        digest = sha256(body).hexdigest()
+        path = self.blobpath(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path),exist_ok=True)
+            # write to a temporary file and rename so readers never see a partial body
+            fd,tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd,'wb') as f:
+                f.write(body)
+            os.replace(tmp,path)
+
+        self.connect().execute(
+            "INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?,?,?)",
+            (key,digest,len(body),r.headers.get('ETag'),r.headers.get('Last-Modified'),now,now))
+
+        self.__stores += 1
+        if self.__stores % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """ This function removes expired and least recently used responses
+
+        Entries unused for max_age seconds are dropped, then the least recently used entries until the stored
+        bodies total at most max_bytes. Only the bodies of dropped entries can be left unreferenced, so only those
+        are checked and removed, keeping a pass proportional to what it evicts rather than to the whole cache
+        """
+        conn = self.connect()
+        cutoff = time.time() - self.max_age
+        # take the write lock up front so only one process evicts at a time
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            dropped = {d for (d,) in conn.execute("SELECT DISTINCT digest FROM entries WHERE used < ?",(cutoff,))}
+            conn.execute("DELETE FROM entries WHERE used < ?",(cutoff,))
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size),0) FROM (SELECT DISTINCT digest,size FROM entries)").fetchone()[0]
+            if total > self.max_bytes:
+                for key,digest,size in conn.execute("SELECT url,digest,size FROM entries ORDER BY used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM entries WHERE url=?",(key,))
+                    dropped.add(digest)
+                    total -= size
+            for digest in dropped:
+                if conn.execute("SELECT 1 FROM entries WHERE digest=? LIMIT 1",(digest,)).fetchone() is None:
+                    try:
+                        os.remove(self.blobpath(digest))
+                    except FileNotFoundError:
+                        pass
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
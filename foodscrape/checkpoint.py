@@ -0,0 +1,126 @@
+import time
+import pickle
+import sqlite3
+
+# GLOBAL constant for the default number of seconds a scraped recipe is reused before it is scraped again
+DEFAULT_STALE = 7*24*60*60
+
+# GLOBAL constant for the number of results buffered before they are committed
+COMMIT_EVERY = 50
+
+# GLOBAL constant for the number of urls looked up per query
+CHUNK = 500
+
+class Checkpoint:
+    """ Persistent store of per-url recipe results
+
+    Keeps, for every recipe url, the pickled RecipeRecord of its last scrape, a Duplicate if the recipe was
+    scraped under another url, or nothing if it failed, along with the time of that scrape. Duplicates count as
+    successful results, so they are not scraped again until stale. Results are committed in small batches as they arrive, so an interrupted run keeps
+    everything but the last batch, and later runs only scrape urls that are new, stale or failed
+
+    Attributes:
+        :path: str; holds the path of the SQLite store
+        :stale: float; holds the seconds a successful result is reused
+        :retry: float; holds the seconds a failed result is kept before the url is retried
+
+    Methods:
+        :pending: returns the urls that need scraping
+        :put: records the result of a scrape
+        :get: returns the stored results of a list of urls
+        :items: yields every stored successful result
+        :flush: commits buffered results
+        :close: commits buffered results and closes the store
+    """
+    def __init__(self,path='checkpoint.sqlite',stale=DEFAULT_STALE,retry=0):
+        self.path = path
+        self.stale = stale
+        self.retry = retry
+        self.__conn = sqlite3.connect(path,timeout=60)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (url TEXT PRIMARY KEY, ok INTEGER NOT NULL, record BLOB, scraped REAL NOT NULL)")
+        self.__conn.commit()
+        self.__buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def lookup(self,urls,columns):
+        """ This function yields the stored rows of a list of urls, CHUNK urls per query
+
+        Parameters:
+            :urls: list; holds recipe urls
+            :columns: str; holds the columns to select after the url
+        """
+        for n in range(0,len(urls),CHUNK):
+            chunk = urls[n:n+CHUNK]
+            yield from self.__conn.execute(
+                "SELECT url,{} FROM results WHERE url IN ({})".format(columns,','.join('?'*len(chunk))),chunk)
+
+    def pending(self,urls):
+        """ This function returns the urls that need scraping
+
+        A url needs scraping if it has no stored result, if its successful result is older than stale seconds,
+        or if its failed result is older than retry seconds
+
+        Parameter:
+            :urls: list; holds recipe urls
+        """
+        self.flush()
+        now = time.time()
+        fresh = set()
+        for url,ok,scraped in self.lookup(urls,'ok,scraped'):
+            if now - scraped < (self.stale if ok else self.retry):
+                fresh.add(url)
+        return [url for url in urls if url not in fresh]
+
+    def put(self,url,record):
+        """ This function records the result of scraping a url
+
+        Parameters:
+            :url: str; holds the recipe url
+            :record: RecipeRecord; holds the scraped recipe, a Duplicate, or None if scraping failed
+        """
+        blob = None if record is None else pickle.dumps(record,pickle.HIGHEST_PROTOCOL)
+        self.__buffer.append((url,record is not None,blob,time.time()))
+        if len(self.__buffer) >= COMMIT_EVERY:
+            self.flush()
+
+    def get(self,urls):
+        """ This function returns the stored results of a list of urls
+
+        Returns a list aligned with urls holding the stored RecipeRecord or Duplicate of each, None where it failed or
+        is missing
+
+        Parameter:
+            :urls: list; holds recipe urls
+        """
+        self.flush()
+        stored = {url:pickle.loads(blob) for url,blob in self.lookup(urls,'record') if blob is not None}
+        return [stored.get(url) for url in urls]
+
+    def items(self):
+        """ This function yields the url, RecipeRecord or Duplicate, and scrape time of every stored successful result
+        """
+        self.flush()
+        for url,blob,scraped in self.__conn.execute("SELECT url,record,scraped FROM results WHERE ok"):
+            yield url,pickle.loads(blob),scraped
+
+    def flush(self):
+        """ This function commits buffered results in one transaction
+        """
+        if not self.__buffer:
+            return
+        with self.__conn:
+            self.__conn.executemany("INSERT OR REPLACE INTO results VALUES (?,?,?,?)",self.__buffer)
+        self.__buffer = []
+
+    def close(self):
+        """ This function commits buffered results and closes the store
+        """
+        self.flush()
+        self.__conn.close()
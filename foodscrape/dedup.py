@@ -0,0 +1,126 @@
+import os
+import re
+import sqlite3
+import tempfile
+from hashlib import blake2b
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from foodscrape.cache import normalize
+
+# GLOBAL constant for the prefixes of query parameters that only track where a link was followed from
+TRACKING = ('utm_','internalsource','referringid','referringcontenttype','clickid','fbclid','gclid')
+
+# GLOBAL precompiled pattern for runs of slashes in a path
+SLASHES = re.compile(r'/{2,}')
+
+def canonical(url):
+    """ This function returns the canonical form of a url found while crawling
+
+    Normalizes the url like the response cache does, collapses repeated slashes, ends directory-like paths with a
+    slash and drops tracking query parameters; recipe pages, which take no parameters, lose their whole query
+
+    Parameter:
+        :url: str; contains webpage
+    """
+    parts = urlsplit(normalize(url))
+    path = SLASHES.sub('/',parts.path)
+    if not path.endswith('/') and '.' not in path.rsplit('/',1)[-1]:
+        path += '/'
+    if path.startswith('/recipe/'):
+        query = ''
+    else:
+        query = urlencode([(k,v) for k,v in parse_qsl(parts.query,keep_blank_values=True)
+                           if not k.lower().startswith(TRACKING)])
+    return urlunsplit((parts.scheme,parts.netloc,path,query,''))
+
+def fingerprint(name,ings):
+    """ This function returns the content fingerprint of a recipe
+
+    A 64-bit hash of the title and the set of listed ingredient strings, case and whitespace folded, so the same
+    recipe reached under different urls gets the same fingerprint before any ingredient is cleaned
+
+    Parameters:
+        :name: str; holds the title of the recipe
+        :ings: list; holds the ingredient strings as listed on the page
+    """
+    fold = lambda s: ' '.join(str(s).lower().split())
+    text = '\n'.join([fold(name or '')] + sorted({fold(ing) for ing in ings}))
+    return int.from_bytes(blake2b(text.encode('utf-8'),digest_size=8).digest(),'little') - 2**63
+
+class SeenSet:
+    """ Process-shared set of recipe fingerprints
+
+    Maps every recipe fingerprint to the url it was first seen at, in an SQLite store shared by every process
+    holding the same path, so Pool workers skip recipes another worker already scraped under a different url.
+    Given a path, the set persists between runs
+
+    Attributes:
+        :path: str; holds the path of the SQLite store
+
+    Methods:
+        :first: returns the url a fingerprint was first claimed by
+        :claim: records a fingerprint for a url, returning the url it was first seen at if that is another url
+        :close: removes the store if it was temporary
+    """
+    def __init__(self,path=None):
+        self.temporary = path is None
+        if path is None:
+            fd,path = tempfile.mkstemp(prefix='seen',suffix='.sqlite')
+            os.close(fd)
+        self.path = path
+        self.__pid = None
+        self.__conn = None
+        self.connect().execute("CREATE TABLE IF NOT EXISTS seen (fingerprint INTEGER PRIMARY KEY, url TEXT NOT NULL)")
+
+    def __getstate__(self):
+        # connections cannot cross process boundaries, the receiving process opens its own
+        state = self.__dict__.copy()
+        state['_SeenSet__pid'] = None
+        state['_SeenSet__conn'] = None
+        return state
+
+    def connect(self):
+        """ This function returns the SQLite connection of the current process, opening it if needed
+        """
+        if self.__pid != os.getpid():
+            self.__conn = sqlite3.connect(self.path,timeout=60,isolation_level=None)
+            self.__conn.execute("PRAGMA journal_mode=WAL")
+            self.__conn.execute("PRAGMA synchronous=NORMAL")
+            self.__pid = os.getpid()
+        return self.__conn
+
+    def first(self,fp):
+        """ This function returns the url a fingerprint was first claimed by, None if it is unclaimed
+
+        Parameter:
+            :fp: int; holds the recipe fingerprint
+        """
+        row = self.connect().execute("SELECT url FROM seen WHERE fingerprint=?",(fp,)).fetchone()
+        return None if row is None else row[0]
+
+    def claim(self,fp,url):
+        """ This function records the fingerprint of the recipe at url
+
+        Returns None if the fingerprint is new or was first seen at this same url, and otherwise the url it was
+        first seen at, making this url a duplicate
+
+        Parameters:
+            :fp: int; holds the recipe fingerprint
+            :url: str; contains recipe webpage
+        """
+        conn = self.connect()
+        if conn.execute("INSERT OR IGNORE INTO seen VALUES (?,?)",(fp,url)).rowcount:
+            return None
+        first, = conn.execute("SELECT url FROM seen WHERE fingerprint=?",(fp,)).fetchone()
+        return None if first == url else first
+
+    def close(self):
+        """ This function removes the store if it was temporary
+        """
+        if self.temporary:
+            if self.__conn is not None:
+                self.__conn.close()
+            self.__conn = None
+            self.__pid = None
+            for suffix in ('','-wal','-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
@@ -0,0 +1,239 @@
+""" Distributed crawl and scrape over a shared work queue
+
+Splits the recipe type tree and the recipe url list into shards in a WorkQueue that any number of independent
+workers, on one host or on several sharing a filesystem, lease shards from. Category shards are expanded into
+subcategory and recipe shards, recipe shards are scraped by each worker's own two-stage pipeline into a partial
+output, a Checkpoint store per worker under the parts directory, and merge combines every partial output into the
+final file
+
+Usage:
+    python -m foodscrape.distributed seed [--queue FILE] [--quant N] [--size N]
+    python -m foodscrape.distributed work [--queue FILE] [--parts DIR] [--cache DIR] [--rate R] [--seen FILE]
+    python -m foodscrape.distributed merge [--queue FILE] [--parts DIR] [--fmt FMT] [--sparse]
+"""
+import os
+import time
+import socket
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from foodscrape.scraping import AllRecipeBook
+from foodscrape.scraping import DEFAULT_QUANT
+from foodscrape.scraping import DEFAULT_WORKERS
+from foodscrape.scraping import GALLERY_URL
+from foodscrape.scraping import ROOT_URL
+from foodscrape.scraping import use_cache
+from foodscrape.scraping import use_archive
+from foodscrape.scraping import use_scheduler
+from foodscrape.scraping import RecipeRecord
+from foodscrape.scheduler import DEFAULT_RATE
+from foodscrape.memo import CleaningCache
+from foodscrape.checkpoint import Checkpoint
+from foodscrape.workqueue import WorkQueue
+from foodscrape.workqueue import DEFAULT_LEASE
+from foodscrape.workqueue import DEFAULT_SHARD
+from foodscrape.encoding import makemetrics
+from foodscrape.encoding import memostats
+from foodscrape.encoding import report
+from foodscrape.encoding import buildFrame
+from foodscrape.encoding import export
+from foodscrape.dedup import canonical
+from foodscrape.dedup import SeenSet
+from foodscrape.pipeline import pipeline
+from foodscrape.pipeline import DEFAULT_FETCHERS
+
+# GLOBAL logger reporting progress
+log = logging.getLogger(__name__)
+
+# GLOBAL constant for the seconds an idle worker waits before asking the queue again
+POLL = 5.0
+
+def seed(queue='queue.sqlite',quant=DEFAULT_QUANT,url=ROOT_URL,size=DEFAULT_SHARD):
+    """ This function sets up the work queue of a distributed run
+
+    Parameters:
+        :queue: str; holds the path of the work queue
+        :quant: int; holds the number of recipes to scrape
+        :url: str; holds the category url the crawl starts from
+        :size: int; holds the number of recipe urls per shard
+    """
+    with WorkQueue(queue) as q:
+        q.seed([url],quant,size)
+
+def expand(q,executor,urls):
+    """ This function expands a shard of category urls
+
+    Fetches every category page on the thread pool and queues its subcategories, or its recipe cards, in new
+    shards, under their canonical urls. Once the queue holds its quantity of recipes, categories are no longer fetched
+
+    Parameters:
+        :q: WorkQueue; holds the work queue
+        :executor: ThreadPoolExecutor; holds the threads fetching pages
+        :urls: list; holds the category urls
+    """
+    if q.full():
+        return
+    for names,links in executor.map(AllRecipeBook.fetchpage,[url for url in urls if url.find(GALLERY_URL) == -1]):
+        # if returns -1, then skip completely
+        if names == -1:
+            continue
+        q.add('category' if names is not None else 'recipe',[canonical(link) for link in links])
+
+def scrape(q,shard,owner,store,urls,memo,metrics,seen,fetchers=DEFAULT_FETCHERS,extractors=None,fast=False):
+    """ This function scrapes a shard of recipe urls into the worker's partial output
+
+    Fetches through the scheduler of this process and extracts on processes, see pipeline.pipeline. Renews the
+    lease of the shard as results arrive, and commits every result before the shard is completed
+
+    Parameters:
+        :q: WorkQueue; holds the work queue
+        :shard: int; holds the id of the leased shard
+        :owner: str; holds the name of the worker
+        :store: Checkpoint; holds the partial output of the worker
+        :urls: list; holds the recipe urls
+        :memo: CleaningCache; holds the memo of cleaned ingredients
+        :metrics: Metrics; holds the process-shared metrics
+        :seen: SeenSet; holds the fingerprints of recipes already scraped
+        :fetchers: int; holds the number of recipe pages fetched at a time
+        :extractors: int; holds the number of processes extracting recipes, None for one per core
+        :fast: bool; if True, extracts with Recipe.fastparse, reading json-ld data or XPath queries instead of a soup
+    """
+    renewed = time.monotonic()
+    for num,r in pipeline(urls,memo,metrics,seen,fetchers,extractors,fast=fast):
+        store.put(urls[num],r)
+        if time.monotonic() - renewed > q.lease/4:
+            if not q.renew(shard,owner):
+                log.warning('lease of shard %d ran out, another worker may scrape it too',shard)
+            renewed = time.monotonic()
+    store.flush()
+
+def work(queue='queue.sqlite',parts='parts',cache=None,memo=None,rate=DEFAULT_RATE,workers=DEFAULT_WORKERS,
+         lease=DEFAULT_LEASE,metrics=None,profile=0.0,archive=None,seen=None,fetchers=DEFAULT_FETCHERS,extractors=None,
+         fast=False):
+    """ This function runs a worker of a distributed run
+
+    Leases shards from the queue and expands or scrapes them until no shard is pending or leased by another worker,
+    writing results to "<parts>/<host>-<pid>.sqlite". A shard that raises is handed back to the queue. Limits are
+    per worker, so workers sharing a site's request budget should each get their share of rate
+
+    Parameters:
+        :queue: str; holds the path of the work queue
+        :parts: str; holds the directory of partial outputs
+        :cache: str; holds the response cache directory, None to disable caching
+        :memo: str; holds the path of a persistent memo of cleaned ingredients, None for one lasting only this run
+        :rate: float; holds the requests per second allowed to each host
+        :workers: int; holds the number of category pages fetched at a time
+        :lease: float; holds the seconds a lease lasts without renewal
+        :metrics: str; holds the path a metrics snapshot is written to, see makeFrame
+        :profile: float; holds the fraction of recipes scraped under cProfile
+        :archive: str; holds the path of an archive every fetched page is recorded into, None for none
+        :seen: str; holds the path of a set of recipe fingerprints shared by every worker, None for one per worker
+        :fetchers: int; holds the number of recipe pages fetched at a time
+        :extractors: int; holds the number of processes extracting recipes, None for one per core
+        :fast: bool; if True, extracts with Recipe.fastparse, reading json-ld data or XPath queries instead of a soup
+    """
+    owner = '{}-{}'.format(socket.gethostname(),os.getpid())
+    os.makedirs(parts,exist_ok=True)
+    use_cache(cache)
+    use_archive(archive)
+    use_scheduler(rate=rate)
+    memo = CleaningCache(memo)
+    seen = SeenSet(seen)
+    stats = makemetrics(profile)
+
+    try:
+        with WorkQueue(queue,lease) as q, Checkpoint(os.path.join(parts,owner + '.sqlite')) as store, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                taken = q.take(owner)
+                if taken is None:
+                    # other workers may still add shards, or crash and leave theirs to be reclaimed
+                    if not q.busy():
+                        break
+                    time.sleep(POLL)
+                    continue
+                shard,kind,urls = taken
+                try:
+                    if kind == 'category':
+                        expand(q,executor,urls)
+                    else:
+                        scrape(q,shard,owner,store,urls,memo,stats,seen,fetchers,extractors,fast)
+                except Exception:
+                    log.exception('shard %d failed',shard)
+                    q.release(shard,owner)
+                    continue
+                q.complete(shard,owner)
+            log.info('queue finished: %s',q.stats())
+    finally:
+        memostats(memo)
+        memo.close()
+        seen.close()
+        report(stats,metrics)
+
+def merge(queue='queue.sqlite',parts='parts',sparse=False,fmt='xlsx',filename=None,compression=None):
+    """ This function merges the partial outputs of a distributed run
+
+    Collects the results of every worker, keeping the latest scrape of a url done twice, and writes them in the
+    order the urls were queued, encoded like to_excel. Returns the recipe DataFrame
+
+    Parameters:
+        :queue: str; holds the path of the work queue
+        :parts: str; holds the directory of partial outputs
+        :sparse: bool; if True, writes the encodings to "data/ingredients.npz" and only the other features to the output
+        :fmt: string; holds the output format, one of xlsx, csv, jsonl, parquet or arrow
+        :filename: string; holds the name of the output file, None for "data/recipes" with the format's extension
+        :compression: string; holds the compression codec of the output, None for the format's default
+    """
+    latest = {}
+    for name in sorted(os.listdir(parts)):
+        if not name.endswith('.sqlite'):
+            continue
+        with Checkpoint(os.path.join(parts,name)) as store:
+            for url,record,scraped in store.items():
+                if url not in latest or scraped > latest[url][1]:
+                    latest[url] = (record,scraped)
+
+    with WorkQueue(queue) as q:
+        stats = q.stats()
+        links = q.links()
+    unfinished = stats.get('pending',0) + stats.get('leased',0)
+    if unfinished:
+        log.warning('merging with %d shards unfinished',unfinished)
+    if stats.get('failed'):
+        log.warning('%d shards failed',stats['failed'])
+
+    # duplicates are kept in the partial outputs like results, but hold no recipe
+    scraped = [url for url in links if url in latest and isinstance(latest[url][0],RecipeRecord)]
+    df = buildFrame([latest[url][0] for url in scraped],scraped)
+    log.info('merged %d of %d recipes',len(df),len(links))
+    export(df,sparse,fmt,filename,compression)
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command',choices=['seed','work','merge'])
+    parser.add_argument('--queue',default='queue.sqlite',help='path of the shared work queue')
+    parser.add_argument('--parts',default='parts',help='directory of partial outputs')
+    parser.add_argument('--quant',type=float,default=DEFAULT_QUANT,help='recipes to scrape, seed only')
+    parser.add_argument('--size',type=int,default=DEFAULT_SHARD,help='recipe urls per shard, seed only')
+    parser.add_argument('--cache',help='response cache directory, work only')
+    parser.add_argument('--memo',help='persistent memo of cleaned ingredients, work only')
+    parser.add_argument('--rate',type=float,default=DEFAULT_RATE,help='requests per second per host, work only')
+    parser.add_argument('--metrics',help='metrics snapshot file, work only')
+    parser.add_argument('--seen',help='set of recipe fingerprints shared by every worker, work only')
+    parser.add_argument('--fast',action='store_true',help='extract with Recipe.fastparse, work only')
+    parser.add_argument('--fmt',default='xlsx',help='output format, merge only')
+    parser.add_argument('--filename',help='output file, merge only')
+    parser.add_argument('--sparse',action='store_true',help='write sparse encodings, merge only')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    if args.command == 'seed':
+        seed(args.queue,args.quant if args.quant == float('inf') else int(args.quant),size=args.size)
+    elif args.command == 'work':
+        work(args.queue,args.parts,args.cache,args.memo,args.rate,metrics=args.metrics,seen=args.seen,fast=args.fast)
+    else:
+        merge(args.queue,args.parts,args.sparse,args.fmt,args.filename)
+
+if __name__ == '__main__':
+    main()
@@ -1,77 +1,426 @@
-import pandas as pd
-from multiprocessing import Pool
-from foodscrape.scraping import Recipe
+import os
+import logging
+import numpy as np
+from foodscrape.scraping import scrape_record
+from foodscrape.scraping import RecipeRecord
 from foodscrape.scraping import scrape_links
 from foodscrape.scraping import DEFAULT_QUANT
-from sklearn.preprocessing import MultiLabelBinarizer
+from foodscrape.scraping import DEFAULT_WORKERS
+from foodscrape.scraping import NUTRIENTS
+from foodscrape.scraping import use_cache
+from foodscrape.scraping import use_memo
+from foodscrape.scraping import use_scheduler
+from foodscrape.scraping import use_metrics
+from foodscrape.scraping import use_archive
+from foodscrape.scraping import use_seen
+from foodscrape.scheduler import DEFAULT_RATE
+from foodscrape.memo import CleaningCache
+from foodscrape.metrics import Metrics
+from foodscrape.writers import makewriter
+from foodscrape.checkpoint import Checkpoint
+from foodscrape.checkpoint import DEFAULT_STALE
+from foodscrape.matrix import EncodedMatrix
+from foodscrape.similarity import openindex
+from foodscrape.archive import PageArchive
+from foodscrape.dedup import SeenSet
+from foodscrape.pipeline import pipeline
+from foodscrape.pipeline import makepool
+from foodscrape.pipeline import DEFAULT_FETCHERS
 
+# GLOBAL logger reporting progress
+log = logging.getLogger(__name__)
 
-def makeFrame(quant=DEFAULT_QUANT,debug=False):
-    """ This function makes a recipe dataframe
+# GLOBAL archive the worker processes of a reprocess read pages from
+r_pages = None
+
+# GLOBAL constant for the default number of recipes per streamed DataFrame
+DEFAULT_CHUNK = 500
 
-    Uses foodscrape to extract recipe data and returns a pandas DataFrame containing the data for the specified quantity of recipes
+def makemetrics(profile):
+    """ This function creates the metrics of a run and records into them from this process
 
     Parameter:
+        :profile: float; holds the fraction of recipes scraped under cProfile
+    """
+    metrics = Metrics(profile)
+    use_metrics(metrics)
+    return metrics
+
+def makeFrame(quant=DEFAULT_QUANT,debug=False,cache=None,memo=None,checkpoint=None,stale=DEFAULT_STALE,rate=DEFAULT_RATE,metrics=None,profile=0.0,archive=None,seen=None,fetchers=DEFAULT_FETCHERS,extractors=None,workers=DEFAULT_WORKERS,fast=False):
+    """ This function makes a recipe dataframe
+
+    Uses foodscrape to extract recipe data and returns a pandas DataFrame containing the data for the specified quantity of recipes.
+    Pages are fetched on threads and extracted on processes, see pipeline.pipeline
+
+    Parameters:
         :quant: int; holds the number of recipes to attempt to scrape
+        :debug: bool; if True, records failed recipes in "error_recipes.txt"
+        :cache: str; holds the response cache directory shared by the crawl and every worker, None to disable caching
+        :memo: str; holds the path of a persistent memo of cleaned ingredients, None for one lasting only this run
+        :checkpoint: str; holds the path of a checkpoint store of per-url results, None to scrape every url
+        :stale: float; holds the seconds a checkpointed result is reused before its url is scraped again
+        :rate: float; holds the requests per second allowed to each host
+        :metrics: str; holds the path a metrics snapshot is written to, Prometheus text format for a .prom file and json
+                  otherwise, None to only log a summary
+        :profile: float; holds the fraction of recipes scraped under cProfile, their profiles written to "profiles/"
+        :archive: str; holds the path of an archive every fetched page is recorded into for reprocessing, None for none
+        :seen: str; holds the path of a persistent set of recipe fingerprints, None for one lasting only this run.
+               A recipe whose title and ingredients were already scraped under another url is skipped as a duplicate
+        :fetchers: int; holds the number of recipe pages fetched at a time
+        :extractors: int; holds the number of processes extracting recipes, None for one per core
+        :workers: int; holds the number of category pages fetched at a time by the crawl, None for the recursive crawl
+        :fast: bool; if True, extracts with Recipe.fastparse, reading json-ld data or XPath queries instead of a soup
     """
+    use_cache(cache)
+    use_archive(archive)
+    use_scheduler(rate=rate)
+    memo = CleaningCache(memo)
+    seen = SeenSet(seen)
+    use_seen(seen)
+    stats = makemetrics(profile)
 
-    # initialize dataframe initially with only title, rating, and ingredients
-    df = pd.DataFrame(columns=["Recipe Title","Rating","Ingredients"])
-    df_nutri = pd.DataFrame()
-        
-    print('pulling recipes...')
-    # initialize the master list of urls
-    book = scrape_links(quant)
-    # iterate over every recipe url, create a list of recipes objects
-    with Pool(10) as p:
-        recipes = p.map(Recipe,book)
+    try:
+        log.info('pulling recipes...')
+        # initialize the master list of urls
+        book = scrape_links(quant,workers)
+        # iterate over every recipe url, create a list of recipe records, None for recipes that failed
+        if checkpoint is None:
+            records = [None]*len(book)
+            for num,r in pipeline(book,memo,stats,seen,fetchers,extractors,fast=fast):
+                records[num] = r
+        else:
+            records = resume(book,checkpoint,stale,memo,stats,seen,fetchers,extractors,fast)
 
-        # and add the title and rating to the dataframe. If fails, record corresponding links.txt index num of recipe to error_recipes log file
+        # if a recipe fails, record corresponding links.txt index num of recipe for the error_recipes log file
         if debug:
             with open('error_recipes.txt','w') as f:
-                errors = 0
-                for num,r in enumerate(recipes):
-                    if r.geterr():
-                        errors += 1
-                        f.write(f'{num}\n')
-                        continue
-                    df.loc[num-errors] = [r.name] + [r.rating] + [r.ingredients]
-                    df_nutri = pd.concat([df_nutri,pd.DataFrame(r.nutrition,index=[num-errors])])
-                f.close()
-        else: 
-            errors = 0
-            for num,r in enumerate(recipes):
-                if r.geterr():
-                    errors += 1
+                f.writelines(f'{num}\n' for num,r in enumerate(records) if r is None)
+    finally:
+        memostats(memo)
+        memo.close()
+        seen.close()
+        report(stats,metrics)
+
+    ok = [num for num,r in enumerate(records) if isinstance(r,RecipeRecord)]
+    out = buildFrame([records[num] for num in ok],[book[num] for num in ok])
+    return out
+
+def resume(book,checkpoint,stale,memo,metrics,seen=None,fetchers=DEFAULT_FETCHERS,extractors=None,fast=False):
+    """ This function scrapes a book of recipe urls incrementally
+
+    Scrapes only the urls of book that the checkpoint store has no fresh result for, recording every result as it
+    arrives, and returns the stored results of the whole book. An interrupted run picks up where it stopped
+
+    Parameters:
+        :book: list; holds recipe urls
+        :checkpoint: str; holds the path of the checkpoint store
+        :stale: float; holds the seconds a stored result is reused
+        :memo: CleaningCache; holds the memo of cleaned ingredients
+        :metrics: Metrics; holds the process-shared metrics
+        :seen: SeenSet; holds the fingerprints of recipes already scraped, None to disable deduplication
+        :fetchers: int; holds the number of recipe pages fetched at a time
+        :extractors: int; holds the number of processes extracting recipes, None for one per core
+        :fast: bool; if True, extracts with Recipe.fastparse, reading json-ld data or XPath queries instead of a soup
+    """
+    with Checkpoint(checkpoint,stale) as store:
+        todo = store.pending(book)
+        log.info('scraping %d of %d recipes...',len(todo),len(book))
+        for num,r in pipeline(todo,memo,metrics,seen,fetchers,extractors,fast=fast):
+            store.put(todo[num],r)
+        return store.get(book)
+
+def initreader(archive,memo,metrics,seen=None):
+    """ This function prepares a Pool worker process of a reprocess
+
+    Parameters:
+        :archive: PageArchive; holds the archive pages are read from
+        :memo: CleaningCache; holds the memo of cleaned ingredients
+        :metrics: Metrics; holds the process-shared metrics
+        :seen: SeenSet; holds the fingerprints of recipes already reprocessed, None to disable deduplication
+    """
+    global r_pages
+    r_pages = archive
+    use_memo(memo)
+    use_metrics(metrics)
+    use_seen(seen)
+
+def reparsed(item):
+    """ This function extracts one archived recipe of an enumerated book
+
+    Returns the index num of the recipe along with its result, see scrape_record
+
+    Parameter:
+        :item: tuple; holds the index num, url, record offset, record length and fast flag of a recipe
+    """
+    num,url,offset,length,fast = item
+    return num,scrape_record(url,r_pages.read(offset,length),fast)
+
+def reprocessFrame(archive='data/pages.warc.gz',urls=None,memo=None,fast=False,processes=None,metrics=None,seen=None):
+    """ This function makes a recipe dataframe from archived pages
+
+    Rebuilds every recipe from its latest archived page instead of fetching it, spread over a pool of extraction
+    processes, see pipeline.makepool, that each read the archive through a memory map, so new cleaning or
+    extraction code can be run over a past crawl with no network at all
+
+    Parameters:
+        :archive: str; holds the path of the archive
+        :urls: list; holds the recipe urls to reprocess, None for every archived recipe page
+        :memo: str; holds the path of a persistent memo of cleaned ingredients, None for one lasting only this run
+        :fast: bool; if True, extracts with Recipe.fastparse
+        :processes: int; holds the number of worker processes, None for one per core
+        :metrics: str; holds the path a metrics snapshot is written to, see makeFrame
+        :seen: str; holds the path of a persistent set of recipe fingerprints, None for one lasting only this run
+    """
+    pages = PageArchive(archive)
+    if urls is None:
+        urls = [url for url in pages.index if '/recipe/' in url]
+    missing = sum(url not in pages for url in urls)
+    if missing:
+        log.warning('%d of %d recipes are not archived',missing,len(urls))
+    urls = [url for url in urls if url in pages]
+    memo = CleaningCache(memo)
+    seen = SeenSet(seen)
+    use_seen(seen)
+    stats = makemetrics(0.0)
+
+    try:
+        log.info('reprocessing %d recipes...',len(urls))
+        items = [(num,url) + pages.index[url] + (fast,) for num,url in enumerate(urls)]
+        records = [None]*len(urls)
+        with makepool(processes or os.cpu_count(),initreader,(pages,memo,stats,seen)) as p:
+            for num,r in p.imap_unordered(reparsed,items,chunksize=16):
+                records[num] = r
+    finally:
+        pages.close()
+        memostats(memo)
+        memo.close()
+        seen.close()
+        report(stats,metrics)
+
+    ok = [num for num,r in enumerate(records) if isinstance(r,RecipeRecord)]
+    return buildFrame([records[num] for num in ok],[urls[num] for num in ok])
+
+def streamFrames(quant=DEFAULT_QUANT,chunksize=DEFAULT_CHUNK,cache=None,memo=None,rate=DEFAULT_RATE,metrics=None,profile=0.0,archive=None,seen=None,fetchers=DEFAULT_FETCHERS,extractors=None,workers=DEFAULT_WORKERS,fast=False):
+    """ This function streams recipe dataframes
+
+    Uses foodscrape to extract recipe data like makeFrame, but yields a pandas DataFrame for every chunksize recipes
+    as soon as they are scraped, in the order they finish. Failed recipes are recorded in "error_recipes.txt" as
+    they occur, so memory holds at most one chunk of recipes whatever the quantity. Closing the generator early
+    still closes the memo and seen store, removing them if they last only this run
+
+    Parameters:
+        :quant: int; holds the number of recipes to attempt to scrape
+        :chunksize: int; holds the number of recipes per yielded DataFrame
+        :cache: str; holds the response cache directory shared by the crawl and every worker, None to disable caching
+        :memo: str; holds the path of a persistent memo of cleaned ingredients, None for one lasting only this run
+        :rate: float; holds the requests per second allowed to each host
+        :metrics: str; holds the path a metrics snapshot is written to, see makeFrame
+        :profile: float; holds the fraction of recipes scraped under cProfile
+        :archive: str; holds the path of an archive every fetched page is recorded into, None for none
+        :seen: str; holds the path of a persistent set of recipe fingerprints, None for one lasting only this run
+        :fetchers: int; holds the number of recipe pages fetched at a time
+        :extractors: int; holds the number of processes extracting recipes, None for one per core
+        :workers: int; holds the number of category pages fetched at a time by the crawl, None for the recursive crawl
+        :fast: bool; if True, extracts with Recipe.fastparse, reading json-ld data or XPath queries instead of a soup
+    """
+    use_cache(cache)
+    use_archive(archive)
+    use_scheduler(rate=rate)
+    memo = CleaningCache(memo)
+    seen = SeenSet(seen)
+    use_seen(seen)
+    stats = makemetrics(profile)
+
+    try:
+        log.info('pulling recipes...')
+        # initialize the master list of urls
+        book = scrape_links(quant,workers)
+        chunk,urls = [],[]
+        with open('error_recipes.txt','w') as f:
+            for num,r in pipeline(book,memo,stats,seen,fetchers,extractors,fast=fast):
+                if r is None:
+                    f.write(f'{num}\n')
+                    f.flush()
                     continue
-                df.loc[num-errors] = [r.name] + [r.rating] + [r.ingredients]
-                df_nutri = pd.concat([df_nutri,pd.DataFrame(r.nutrition,index=[num-errors])])
-    
-    out = pd.concat([df,df_nutri],axis=1)
+                if not isinstance(r,RecipeRecord):
+                    continue
+                chunk.append(r)
+                urls.append(book[num])
+                if len(chunk) >= chunksize:
+                    yield buildFrame(chunk,urls)
+                    chunk,urls = [],[]
+            if chunk:
+                yield buildFrame(chunk,urls)
+    finally:
+        memostats(memo)
+        memo.close()
+        seen.close()
+        report(stats,metrics)
+
+def buildFrame(recipes,urls=None):
+    """ This function makes a recipe dataframe from scraped recipes
+
+    Collects each feature into its own column and builds the frame once. The float32 nutrition arrays of the
+    records are joined into a single recipes by NUTRIENTS matrix, so the nutrition columns form one numeric block.
+    The frame is indexed by recipe url when urls are given, which no writer outputs
+
+    Parameters:
+        :recipes: list; holds RecipeRecord objects of recipes scraped without error
+        :urls: list; holds the url of every recipe, None for a range index
+    """
+    import pandas as pd
+    titles,ratings,ingredients,nutrition = [],[],[],[]
+    for r in recipes:
+        titles.append(r.name)
+        ratings.append(r.rating)
+        ingredients.append(r.ingredients)
+        nutrition.append(r.nutrition.tobytes())
+    block = np.frombuffer(b''.join(nutrition),dtype=np.float32).reshape(len(recipes),len(NUTRIENTS))
+
+    # build the frame once from the typed columns and the nutrition block
+    out = pd.concat([
+        pd.DataFrame({
+            "Recipe Title":pd.array(titles,dtype='string'),
+            "Rating":np.array(ratings,dtype='float32'),
+            "Ingredients":pd.Series(ingredients,dtype=object)
+        }),
+        pd.DataFrame(block.copy(),columns=NUTRIENTS)
+    ],axis=1)
+    if urls is not None:
+        out.index = pd.Index(list(urls),name='URL')
     return out
 
-def encode(df):
+def memostats(memo):
+    """ This function reports the hits and misses of a memo of cleaned ingredients
+
+    Parameter:
+        :memo: CleaningCache; holds the memo of cleaned ingredients
+    """
+    stats = memo.stats()
+    log.info('cleaning memo: %d hits, %d misses',stats['hits']+stats['local_hits'],stats['misses'])
+
+def report(stats,path=None):
+    """ This function reports the metrics of a run
+
+    Logs the mean time of every stage that ran and every kind of error that occurred, and writes a snapshot of
+    every metric if given a path
+
+    Parameters:
+        :stats: Metrics; holds the process-shared metrics of the run
+        :path: str; holds the path of the snapshot, Prometheus text format for a .prom file and json otherwise
+    """
+    snap = stats.snapshot()
+    counters = snap['counters']
+    log.info('fetched %d pages, %d bytes; scraped %d recipes, %d failed, %d duplicates',
+             counters['pages'],counters['bytes'],counters['recipes'],counters['failed'],counters['duplicates'])
+    for name,timer in snap['timers'].items():
+        if timer['count']:
+            log.info('%s: %d runs, %.1f ms mean',name,timer['count'],1e3*timer['seconds']/timer['count'])
+    errors = {kind:n for kind,n in snap['errors'].items() if n}
+    if errors:
+        log.info('errors: %s',', '.join('{} {}'.format(kind,n) for kind,n in errors.items()))
+    if path is not None:
+        stats.export(path)
+
+def encode(df,sparse=False):
     """ This function encodes recipe ingredients into one-hot encodings
 
-    Takes a pandas DataFrame, creates a dictionary of ingredients, and uses it to create one-hot encodings for each recipe
+    Takes a pandas DataFrame, creates a dictionary of ingredients, and uses it to create one-hot encodings for each recipe.
+    In sparse mode the encodings are pandas sparse columns built from a CSR matrix, so memory grows with the number of
+    listed ingredients rather than recipes times vocabulary
     
-    Parameter:
+    Parameters:
         :df: DataFrame; holds features for all processed recipes
+        :sparse: bool; if True, encodes ingredients into sparse columns
     """
-    # create a dataframe of ingredients in preparation for one-hot encodings
+    import pandas as pd
+    from sklearn.preprocessing import MultiLabelBinarizer
+    # create a list of ingredients per recipe in preparation for one-hot encodings
     ing_list = df.Ingredients.apply(lambda x: list(x))
-    ing_df = pd.DataFrame({"Ingredients":ing_list})
 
     # create a MultiLabelBinarizer and transform ingredients into encodings
-    mlb = MultiLabelBinarizer()
+    mlb = MultiLabelBinarizer(sparse_output=sparse)
+    matrix = mlb.fit_transform(ing_list)
 
-    ing_encodings = pd.DataFrame(mlb.fit_transform(ing_df["Ingredients"]),columns=mlb.classes_)
+    if sparse:
+        ing_encodings = pd.DataFrame.sparse.from_spmatrix(matrix.astype(np.uint8),index=df.index,columns=mlb.classes_)
+    else:
+        ing_encodings = pd.DataFrame(matrix,index=df.index,columns=mlb.classes_)
 
     # concatenate ingredients encodings to dataframe
     df_with_encodings = pd.concat([df,ing_encodings],axis=1)
 
     return df_with_encodings
 
+def encode_append(df,directory='data/encoded'):
+    """ This function appends recipe encodings to a persistent encoded matrix
+
+    Encodes the ingredients of every recipe not in the matrix yet against its vocabulary, with stable column ids,
+    and appends them as new rows keyed by url. Returns the number of rows appended. Read the matrix with
+    matrix.openmatrix
+
+    Parameters:
+        :df: DataFrame; holds features for processed recipes, indexed by url as makeFrame and streamFrames return them
+        :directory: str; holds the directory of the encoded matrix
+    """
+    with EncodedMatrix(directory) as matrix:
+        return matrix.append(list(df.index),df.Ingredients)
+
+def index_append(df,directory='data/index'):
+    """ This function adds recipes to a persistent similarity index
+
+    Adds every recipe not in the index yet, with its ingredients and nutrition, and saves the index. Returns the
+    number of recipes added. Query the index with similarity.SimilarityIndex.load
+
+    Parameters:
+        :df: DataFrame; holds features for processed recipes, indexed by url as makeFrame and streamFrames return them
+        :directory: str; holds the directory of the similarity index
+    """
+    index = openindex(directory)
+    added = index.add(list(df.index),df.Ingredients,df[NUTRIENTS].to_numpy(dtype=np.float32))
+    if added:
+        index.save(directory)
+    return added
+
+def sparse_export(df,filename):
+    """ This function exports the sparse columns of a DataFrame
+
+    Writes every sparse column, such as the encodings from encode(df,sparse=True), into a CSR matrix saved as .npz
+    and writes the column names, one per line, into a vocabulary file next to it
+
+    Parameters:
+        :df: DataFrame; holds features for all processed recipes
+        :filename: string; holds the name of the .npz output file
+    """
+    import pandas as pd
+    from scipy.sparse import save_npz
+    columns = [c for c,dtype in df.dtypes.items() if isinstance(dtype,pd.SparseDtype)]
+    matrix = df[columns].sparse.to_coo().tocsr()
+    save_npz(filename,matrix)
+    with open(vocabname(filename),'w') as f:
+        f.writelines(f'{c}\n' for c in columns)
+
+def sparse_import(filename):
+    """ This function reads encodings written by sparse_export
+
+    Returns the CSR matrix and the list of column names
+
+    Parameter:
+        :filename: string; holds the name of the .npz file
+    """
+    from scipy.sparse import load_npz
+    with open(vocabname(filename)) as f:
+        columns = [line[:-1] for line in f]
+    return load_npz(filename),columns
+
+def vocabname(filename):
+    """ This function returns the name of the vocabulary file belonging to a .npz file
+
+    Parameter:
+        :filename: string; holds the name of the .npz file
+    """
+    return filename[:-4] + '.vocab.txt' if filename.endswith('.npz') else filename + '.vocab.txt'
+
 def excel_export(df,filename):
     """ This function exports data to excel
     
@@ -81,22 +430,103 @@ def excel_export(df,filename):
         :df: DataFrame; holds features for all processed recipes
         :filename: string; holds the name of the output file
     """
-    writer = pd.ExcelWriter(filename,engine='xlsxwriter')
-    df.to_excel(writer,sheet_name='Sheet1',index=False)
-    writer.save()
+    import pandas as pd
+    with pd.ExcelWriter(filename,engine='xlsxwriter') as writer:
+        df.to_excel(writer,sheet_name='Sheet1',index=False)
 
-def to_excel(quant=DEFAULT_QUANT):
+def to_excel(quant=DEFAULT_QUANT,cache=None,memo=None,sparse=False,fmt='xlsx',filename=None,compression=None,checkpoint=None,stale=DEFAULT_STALE,rate=DEFAULT_RATE,metrics=None,profile=0.0,encoded=None,archive=None,seen=None,index=None,fetchers=DEFAULT_FETCHERS,extractors=None,workers=DEFAULT_WORKERS,fast=False):
     """ This function converts recipe urls into encoded feature vectors
 
     Creates a pandas DataFrame with recipe data, then one-hot encodes the DataFrame, and then
-    sends it to excel
+    sends it to excel, or to any other output format in writers.WRITERS
 
-    Parameter:
+    Parameters:
+        :quant: int; stores number of recipes to attempt to scrape
+        :cache: str; holds the response cache directory, None to disable caching
+        :memo: str; holds the path of a persistent memo of cleaned ingredients, None for one lasting only this run
+        :sparse: bool; if True, writes the encodings to "data/ingredients.npz" and only the other features to the output
+        :fmt: string; holds the output format, one of xlsx, csv, jsonl, parquet or arrow
+        :filename: string; holds the name of the output file, None for "data/recipes" with the format's extension
+        :compression: string; holds the compression codec of the output, None for the format's default
+        :checkpoint: str; holds the path of a checkpoint store of per-url results, None to scrape every url
+        :stale: float; holds the seconds a checkpointed result is reused before its url is scraped again
+        :rate: float; holds the requests per second allowed to each host
+        :metrics: str; holds the path a metrics snapshot is written to, see makeFrame
+        :profile: float; holds the fraction of recipes scraped under cProfile
+        :encoded: str; holds the directory of a persistent encoded matrix new recipes are appended to, None for none
+        :archive: str; holds the path of an archive every fetched page is recorded into, None for none
+        :seen: str; holds the path of a persistent set of recipe fingerprints, None for one lasting only this run
+        :index: str; holds the directory of a persistent similarity index new recipes are added to, None for none
+        :fetchers: int; holds the number of recipe pages fetched at a time
+        :extractors: int; holds the number of processes extracting recipes, None for one per core
+        :workers: int; holds the number of category pages fetched at a time by the crawl, None for the recursive crawl
+        :fast: bool; if True, extracts with Recipe.fastparse, reading json-ld data or XPath queries instead of a soup
+    """
+    log.info('creating df...')
+    df = makeFrame(quant,cache=cache,memo=memo,checkpoint=checkpoint,stale=stale,rate=rate,metrics=metrics,profile=profile,archive=archive,seen=seen,
+                   fetchers=fetchers,extractors=extractors,workers=workers,fast=fast)
+    if encoded is not None:
+        log.info('appended %d recipes to the encoded matrix',encode_append(df,encoded))
+    if index is not None:
+        log.info('added %d recipes to the similarity index',index_append(df,index))
+    export(df,sparse,fmt,filename,compression)
+
+def export(df,sparse=False,fmt='xlsx',filename=None,compression=None):
+    """ This function encodes a recipe dataframe and writes it out
+
+    One-hot encodes the ingredients of the DataFrame and sends it to the writer of the chosen format, see to_excel
+
+    Parameters:
+        :df: DataFrame; holds features for all processed recipes
+        :sparse: bool; if True, writes the encodings to "data/ingredients.npz" and only the other features to the output
+        :fmt: string; holds the output format, one of xlsx, csv, jsonl, parquet or arrow
+        :filename: string; holds the name of the output file, None for "data/recipes" with the format's extension
+        :compression: string; holds the compression codec of the output, None for the format's default
+    """
+    log.info('encoding df...')
+    encoded_df = encode(df,sparse)
+    log.info('exporting df...')
+    if sparse:
+        sparse_export(encoded_df,'data/ingredients.npz')
+        encoded_df = encoded_df[df.columns]
+    with makewriter(fmt,filename,compression) as writer:
+        writer.write(encoded_df.drop(columns=['Ingredients']))
+
+def to_stream(quant=DEFAULT_QUANT,filename=None,chunksize=DEFAULT_CHUNK,cache=None,memo=None,fmt='csv',compression=None,rate=DEFAULT_RATE,metrics=None,profile=0.0,encoded=None,archive=None,seen=None,index=None,fetchers=DEFAULT_FETCHERS,extractors=None,workers=DEFAULT_WORKERS,fast=False):
+    """ This function streams recipe features into an output file
+
+    Appends every DataFrame from streamFrames to the output as soon as it is scraped, with ingredients kept as
+    lists, or joined by "; " for csv and xlsx, rather than one-hot encoded. Except for xlsx, which cannot be
+    appended to, memory stays bounded even for float('inf') recipes
+
+    Parameters:
         :quant: int; stores number of recipes to attempt to scrape
+        :filename: string; holds the name of the output file, None for "data/recipes" with the format's extension
+        :chunksize: int; holds the number of recipes written at a time
+        :cache: str; holds the response cache directory, None to disable caching
+        :memo: str; holds the path of a persistent memo of cleaned ingredients, None for one lasting only this run
+        :fmt: string; holds the output format, one of csv, jsonl, parquet, arrow or xlsx
+        :compression: string; holds the compression codec of the output, None for the format's default
+        :rate: float; holds the requests per second allowed to each host
+        :metrics: str; holds the path a metrics snapshot is written to, see makeFrame
+        :profile: float; holds the fraction of recipes scraped under cProfile
+        :encoded: str; holds the directory of a persistent encoded matrix new recipes are appended to, None for none
+        :archive: str; holds the path of an archive every fetched page is recorded into, None for none
+        :seen: str; holds the path of a persistent set of recipe fingerprints, None for one lasting only this run
+        :index: str; holds the directory of a persistent similarity index new recipes are added to, None for none
+        :fetchers: int; holds the number of recipe pages fetched at a time
+        :extractors: int; holds the number of processes extracting recipes, None for one per core
+        :workers: int; holds the number of category pages fetched at a time by the crawl, None for the recursive crawl
+        :fast: bool; if True, extracts with Recipe.fastparse, reading json-ld data or XPath queries instead of a soup
     """
-    print('creating df...')
-    df = makeFrame(quant)
-    print('encoding df...')
-    encoded_df = encode(df)
-    print('exporting df...')
-    excel_export(encoded_df.drop(columns=['Ingredients']),'data/recipes.xlsx')
+    log.info('streaming df...')
+    # the index is read once and saved after every chunk rather than reread for every chunk
+    sim = openindex(index) if index is not None else None
+    with makewriter(fmt,filename,compression) as writer:
+        for df in streamFrames(quant,chunksize,cache,memo,rate,metrics,profile,archive,seen,fetchers,extractors,
+                               workers,fast):
+            writer.write(df)
+            if encoded is not None:
+                encode_append(df,encoded)
+            if sim is not None and sim.add(list(df.index),df.Ingredients,df[NUTRIENTS].to_numpy(dtype=np.float32)):
+                sim.save(index)
@@ -0,0 +1,177 @@
+import os
+from array import array
+from hashlib import blake2b
+
+# GLOBAL constant for the number of links buffered before a batch is written and synced
+DEFAULT_BATCH = 256
+
+def linkhash(link):
+    """ This function hashes a link
+
+    Returns a 64-bit integer digest of the link, used as its key in the membership index
+
+    Parameter:
+        :link: str; contains recipe url
+    """
+    return int.from_bytes(blake2b(link.encode('utf-8'),digest_size=8).digest(),'little')
+
+class LinkStore:
+    """ Append-only, indexed store of recipe links
+
+    Links are kept one per line in a plain text file, so "links.txt" stays readable and its line numbers stay
+    meaningful. Next to it lives a binary index holding the end offset and 64-bit hash of every line, so that
+    membership is a set lookup, range reads seek straight to the wanted lines, and start-up never re-reads the text
+
+    Attributes:
+        :path: str; holds the path of the text file
+        :batch: int; holds the number of links buffered before they are written and synced
+        :ends: array; holds the byte offset at which every stored line ends
+        :hashes: set; holds the hash of every stored or buffered link
+
+    Methods:
+        :add: buffers a link for writing, returns False if already stored
+        :range: returns the list of links between two line numbers
+        :flush: writes and syncs buffered links and their index entries
+        :close: flushes the store
+    """
+    def __init__(self,path='links.txt',batch=DEFAULT_BATCH):
+        self.path = path
+        self.batch = batch
+        self.ends = array('Q')
+        self.hashes = set()
+        self.__index = path + '.idx'
+        self.__buffer = []
+        self.load()
+
+    def __contains__(self,link):
+        return linkhash(link) in self.hashes
+
+    def __len__(self):
+        return len(self.ends) + len(self.__buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def load(self):
+        """ This function reads the offset index and brings it up to date with the text file
+
+        Lines appended without an index entry, such as a "links.txt" from an earlier version or a crash between
+        the two writes, are indexed from the text file; a partially written last line is truncated
+        """
+        if not os.path.exists(self.path):
+            open(self.path,'a').close()
+        size = os.path.getsize(self.path)
+
+        # read the interleaved end offset,hash pairs, discarding a partially written pair
+        pairs = array('Q')
+        if os.path.exists(self.__index):
+            with open(self.__index,'rb') as f:
+                raw = f.read()
+            pairs.frombytes(raw[:len(raw) - len(raw) % (2*pairs.itemsize)])
+        ends,hashes = pairs[0::2],pairs[1::2]
+
+        # if the text file was truncated behind the index, the index cannot be trusted
+        if ends and ends[-1] > size:
+            ends,hashes = array('Q'),array('Q')
+        self.ends = array('Q',ends)
+        self.hashes = set(hashes)
+
+        # index any complete lines past the last indexed offset and drop any incomplete one
+        start = ends[-1] if ends else 0
+        tail = array('Q')
+        with open(self.path,'rb+') as f:
+            f.seek(start)
+            pos = start
+            for line in f:
+                if not line.endswith(b'\n'):
+                    f.truncate(pos)
+                    break
+                pos += len(line)
+                h = linkhash(line.decode('utf-8').strip())
+                tail.extend((pos,h))
+                self.ends.append(pos)
+                self.hashes.add(h)
+
+        # rewrite the index whenever it disagreed with the text file
+        if tail or len(pairs) != 2*len(self.ends):
+            pairs = array('Q')
+            for pos,h in zip(ends,hashes):
+                pairs.extend((pos,h))
+            pairs.extend(tail)
+            with open(self.__index,'wb') as f:
+                pairs.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def add(self,link):
+        """ This function buffers a link to be appended to the store
+
+        Returns True if the link is new, False if it was already stored. Every batch links the buffer is flushed
+
+        Parameter:
+            :link: str; contains recipe url
+        """
+        h = linkhash(link)
+        if h in self.hashes:
+            return False
+        self.hashes.add(h)
+        self.__buffer.append((link,h))
+        if len(self.__buffer) >= self.batch:
+            self.flush()
+        return True
+
+    def flush(self):
+        """ This function writes buffered links and their index entries in one batch each and syncs both files
+
+        The text is synced before the index so that a crash can only leave lines that load will re-index
+        """
+        if not self.__buffer:
+            return
+        pos = self.ends[-1] if self.ends else 0
+        lines = []
+        pairs = array('Q')
+        for link,h in self.__buffer:
+            line = '{}\n'.format(link).encode('utf-8')
+            pos += len(line)
+            lines.append(line)
+            pairs.extend((pos,h))
+
+        with open(self.path,'ab') as f:
+            f.write(b''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.__index,'ab') as f:
+            pairs.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.ends.extend(pairs[0::2])
+        self.__buffer = []
+
+    def range(self,num=0,stop=None):
+        """ This function reads a range of stored links
+
+        Returns the list of links from line number num up to, but excluding, line number stop, seeking
+        directly to the first line rather than reading the lines before it
+
+        Parameters:
+            :num: int; holds starting line number, 0 by default
+            :stop: int; holds the ending line number, None by default for every stored line
+        """
+        self.flush()
+        stop = len(self.ends) if stop is None else min(stop,len(self.ends))
+        if num >= stop:
+            return []
+        start = self.ends[num-1] if num > 0 else 0
+        with open(self.path,'rb') as f:
+            f.seek(start)
+            raw = f.read(self.ends[stop-1] - start)
+        return raw.decode('utf-8').splitlines()
+
+    def close(self):
+        """ This function flushes any buffered links to disk
+        """
+        self.flush()
@@ -0,0 +1,203 @@
+import os
+import numpy as np
+from itertools import chain
+from foodscrape.linkstore import LinkStore
+
+# GLOBAL constant for the file names of an encoded matrix directory
+VOCAB,KEYS,INDPTR,INDICES,DATA = 'vocab.txt','keys.txt','indptr.i64','indices.i32','data.u8'
+
+class Vocabulary:
+    """ Append-only ingredient vocabulary
+
+    Ingredients are kept one per line in a text file and an ingredient's line number is its column id, so ids never
+    change once given out. New ingredients are appended and synced before any row refers to them
+
+    Attributes:
+        :path: str; holds the path of the text file
+        :terms: list; holds every ingredient by column id
+        :ids: dict; holds the column id of every ingredient
+
+    Methods:
+        :lookup: returns the column ids of a list of ingredients, giving new ones the next ids
+    """
+    def __init__(self,path):
+        self.path = path
+        self.terms = readlines(path)
+        self.ids = {term:n for n,term in enumerate(self.terms)}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def lookup(self,terms):
+        """ This function returns the column ids of a list of ingredients
+
+        Ingredients not in the vocabulary are appended to it in one synced write
+
+        Parameter:
+            :terms: iterable; holds ingredient strings
+        """
+        out = []
+        new = []
+        for term in terms:
+            term = term.replace('\n',' ')
+            num = self.ids.get(term)
+            if num is None:
+                num = self.ids[term] = len(self.terms)
+                self.terms.append(term)
+                new.append(term)
+            out.append(num)
+        if new:
+            with open(self.path,'ab') as f:
+                f.write(''.join(f'{term}\n' for term in new).encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+        return out
+
+def readlines(path):
+    """ This function returns the complete lines of a text file, truncating a partially written last line
+
+    Parameter:
+        :path: str; holds the path of the text file
+    """
+    if not os.path.exists(path):
+        open(path,'a').close()
+    with open(path,'rb') as f:
+        raw = f.read()
+    end = raw.rfind(b'\n') + 1
+    if end < len(raw):
+        os.truncate(path,end)
+    return raw[:end].decode('utf-8').split('\n')[:-1]
+
+class EncodedMatrix:
+    """ Persistent, append-only one-hot ingredient matrix
+
+    Rows are recipes and columns the ids of a Vocabulary kept alongside, so new recipes are encoded against the
+    columns of earlier runs and appended without re-encoding anything. The matrix is stored in CSR form as flat
+    binary files, int64 row pointers, int32 column ids and uint8 values, that openmatrix maps into memory. Every
+    row has a key, such as its recipe url, kept in a LinkStore so that a key is only ever appended once. Appends
+    write values first and row pointers, then keys, last, and an interrupted append is rolled back on open.
+    A matrix has a single writer at a time, while any number of readers may open it with openmatrix
+
+    Attributes:
+        :directory: str; holds the directory of the matrix files
+        :vocab: Vocabulary; holds the ingredient vocabulary
+        :keys: LinkStore; holds the key of every row
+        :rows: int; holds the number of rows
+        :nnz: int; holds the number of stored values
+
+    Methods:
+        :append: appends the rows of keys not stored yet
+        :close: closes the key store
+    """
+    def __init__(self,directory='data/encoded'):
+        os.makedirs(directory,exist_ok=True)
+        self.directory = directory
+        self.vocab = Vocabulary(self.path(VOCAB))
+        self.keys = LinkStore(self.path(KEYS))
+        self.recover()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def __contains__(self,key):
+        return key in self.keys
+
+    def __len__(self):
+        return self.rows
+
+    def path(self,name):
+        """ This function returns the path of one of the matrix files
+
+        Parameter:
+            :name: str; holds the file name
+        """
+        return os.path.join(self.directory,name)
+
+    def recover(self):
+        """ This function rolls back whatever an interrupted append left past the last complete row
+        """
+        indptr = np.fromfile(self.path(INDPTR),dtype=np.int64) if os.path.exists(self.path(INDPTR)) else np.zeros(0,np.int64)
+        if not len(indptr):
+            np.zeros(1,np.int64).tofile(self.path(INDPTR))
+            indptr = np.zeros(1,np.int64)
+        self.rows = min(len(indptr) - 1,len(self.keys))
+        self.nnz = int(indptr[self.rows])
+        for name,size in ((INDPTR,8*(self.rows + 1)),(INDICES,4*self.nnz),(DATA,self.nnz)):
+            if not os.path.exists(self.path(name)):
+                open(self.path(name),'a').close()
+            if os.path.getsize(self.path(name)) > size:
+                os.truncate(self.path(name),size)
+
+    def append(self,keys,ingredients):
+        """ This function encodes and appends recipes whose key is not stored yet
+
+        Returns the number of rows appended
+
+        Parameters:
+            :keys: list; holds the key of every recipe, such as its url
+            :ingredients: iterable; holds the collection of base ingredients of every recipe, aligned with keys
+        """
+        new,seen = [],set()
+        for key,ings in zip(keys,ingredients):
+            if key not in self.keys and key not in seen:
+                seen.add(key)
+                new.append((key,ings))
+        if not new:
+            return 0
+
+        # encode every row against the vocabulary, growing it first so that rows only refer to stored columns
+        ids = self.vocab.lookup(chain.from_iterable(ings for key,ings in new))
+        cols,start = [],0
+        for key,ings in new:
+            cols.append(sorted(set(ids[start:start+len(ings)])))
+            start += len(ings)
+        lengths = np.fromiter((len(c) for c in cols),dtype=np.int64,count=len(cols))
+        indices = np.fromiter(chain.from_iterable(cols),dtype=np.int32,count=int(lengths.sum()))
+
+        for name,arr in ((INDICES,indices),(DATA,np.ones(len(indices),dtype=np.uint8)),
+                         (INDPTR,self.nnz + np.cumsum(lengths))):
+            with open(self.path(name),'ab') as f:
+                f.write(arr.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        for key,ings in new:
+            self.keys.add(key)
+        self.keys.flush()
+
+        self.rows += len(new)
+        self.nnz += len(indices)
+        return len(new)
+
+    def close(self):
+        """ This function writes out any buffered keys
+        """
+        self.keys.close()
+
+def openmatrix(directory='data/encoded'):
+    """ This function opens an encoded matrix for reading without loading it
+
+    Returns a scipy CSR matrix whose column ids and values are read-only memory maps of the matrix files, the list of
+    ingredients by column id and the list of row keys. Rows appended while the matrix is open are not seen
+
+    Parameter:
+        :directory: str; holds the directory of the matrix files
+    """
+    indptr = np.fromfile(os.path.join(directory,INDPTR),dtype=np.int64)
+    with open(os.path.join(directory,KEYS),encoding='utf-8') as f:
+        keys = [line[:-1] for line in f if line.endswith('\n')]
+    rows = min(len(indptr) - 1,len(keys))
+    nnz = int(indptr[rows])
+    with open(os.path.join(directory,VOCAB),encoding='utf-8') as f:
+        terms = [line[:-1] for line in f if line.endswith('\n')]
+
+    from scipy.sparse import csr_matrix
+    if nnz:
+        indices = np.memmap(os.path.join(directory,INDICES),dtype=np.int32,mode='r',shape=(nnz,))
+        data = np.memmap(os.path.join(directory,DATA),dtype=np.uint8,mode='r',shape=(nnz,))
+    else:
+        indices,data = np.zeros(0,np.int32),np.zeros(0,np.uint8)
+    matrix = csr_matrix((data,indices,indptr[:rows+1]),shape=(rows,len(terms)),copy=False)
+    return matrix,terms,keys[:rows]
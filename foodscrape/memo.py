@@ -0,0 +1,208 @@
+import os
+import time
+import sqlite3
+import tempfile
+from collections import OrderedDict
+from foodscrape.metrics import context
+
+# GLOBAL constant for the version of the ingredient cleaning of Recipe, to be bumped whenever the base ingredients it
+# picks change so that memos persisted by earlier cleaning are reset rather than served
+CLEANING_VERSION = 1
+
+# GLOBAL constant for the default number of cleaned ingredients kept by a cache
+DEFAULT_MAXSIZE = 100000
+
+# GLOBAL constant for the default number of cleaned ingredients each process keeps in memory
+DEFAULT_LOCAL = 10000
+
+# GLOBAL constant for the number of inserts a process makes between trims of the shared store
+TRIM_EVERY = 500
+
+# GLOBAL constant for the number of strings looked up in the shared store per query
+CHUNK = 500
+
+# GLOBAL sentinel telling a missing entry apart from a cached None
+MISSING = object()
+
+class CleaningCache:
+    """ Bounded, process-shared memo of cleaned ingredients
+
+    Maps an ingredient string, as passed to Recipe.cleaning, to its base ingredient. Each process keeps a small
+    in-memory LRU in front of an SQLite store shared by every process holding the same path; the store keeps its
+    maxsize most recently used entries and, when given a path, persists between runs. Hit and miss counters live
+    in shared memory, so a copy passed to Pool workers as an initializer argument counts for the whole pool. The
+    store records the version of the cleaning its entries come from and is emptied when opened with another one
+
+    Attributes:
+        :path: str; holds the path of the SQLite store
+        :version: int; holds the version of the cleaning the stored entries come from
+        :maxsize: int; holds the number of entries kept in the shared store
+        :local: int; holds the number of entries kept in each process's memory
+
+    Methods:
+        :get: returns the cleaned value of an ingredient, computing and storing it on a miss
+        :getmany: returns the cleaned values of a batch of ingredients, computing all misses in one call
+        :stats: returns a dict of hit, miss and size counts
+        :close: removes the store if it was temporary
+    """
+    def __init__(self,path=None,maxsize=DEFAULT_MAXSIZE,local=DEFAULT_LOCAL,version=CLEANING_VERSION):
+        self.temporary = path is None
+        if path is None:
+            fd,path = tempfile.mkstemp(prefix='cleaning',suffix='.sqlite')
+            os.close(fd)
+        self.path = path
+        self.maxsize = maxsize
+        self.local = local
+        self.version = version
+        self.__hits = context().Value('q',0)
+        self.__localhits = context().Value('q',0)
+        self.__misses = context().Value('q',0)
+        self.__lru = OrderedDict()
+        self.__pid = None
+        self.__conn = None
+        self.__inserts = 0
+        conn = self.connect()
+        # take the write lock up front so that only one process checks and resets the store
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("CREATE TABLE IF NOT EXISTS cleaned (ing TEXT PRIMARY KEY, base TEXT, used REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cleaned_used ON cleaned (used)")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != version:
+            conn.execute("DELETE FROM cleaned")
+            conn.execute("PRAGMA user_version={:d}".format(version))
+        conn.execute("COMMIT")
+
+    def __getstate__(self):
+        # connections cannot cross process boundaries, the receiving process opens its own
+        state = self.__dict__.copy()
+        state['_CleaningCache__pid'] = None
+        state['_CleaningCache__conn'] = None
+        state['_CleaningCache__lru'] = OrderedDict()
+        return state
+
+    def connect(self):
+        """ This function returns the SQLite connection of the current process, opening it if needed
+        """
+        if self.__pid != os.getpid():
+            self.__conn = sqlite3.connect(self.path,timeout=60,isolation_level=None)
+            self.__conn.execute("PRAGMA journal_mode=WAL")
+            self.__conn.execute("PRAGMA synchronous=NORMAL")
+            self.__pid = os.getpid()
+            self.__lru = OrderedDict()
+        return self.__conn
+
+    def get(self,ing,clean):
+        """ This function returns the cleaned value of an ingredient
+
+        Looks in this process's memory first, then in the shared store, and only on a miss in both calls clean
+
+        Parameters:
+            :ing: str; holds the ingredient string
+            :clean: function; returns the base ingredient of an ingredient string
+        """
+        return self.getmany([ing],lambda ings: [clean(i) for i in ings])[0]
+
+    def getmany(self,ings,cleanmany):
+        """ This function returns the cleaned values of a batch of ingredients
+
+        Looks every string up in this process's memory, then the rest in the shared store, and calls cleanmany once
+        on the strings missing from both, storing its results in a single transaction
+
+        Parameters:
+            :ings: list; holds the ingredient strings
+            :cleanmany: function; returns the list of base ingredients of a list of ingredient strings
+        """
+        out = [MISSING]*len(ings)
+        todo = {}
+        for i,ing in enumerate(ings):
+            base = self.__lru.get(ing,MISSING)
+            if base is not MISSING:
+                self.__lru.move_to_end(ing)
+                out[i] = base
+            else:
+                todo.setdefault(ing,[]).append(i)
+        if len(todo) < len(ings):
+            with self.__localhits.get_lock():
+                self.__localhits.value += len(ings) - sum(len(idx) for idx in todo.values())
+        if not todo:
+            return out
+
+        # look the remaining strings up in the shared store
+        conn = self.connect()
+        keys = list(todo)
+        found = {}
+        for n in range(0,len(keys),CHUNK):
+            chunk = keys[n:n+CHUNK]
+            rows = conn.execute(
+                "SELECT ing,base FROM cleaned WHERE ing IN ({})".format(','.join('?'*len(chunk))),chunk)
+            found.update(rows)
+        now = time.time()
+        if found:
+            conn.executemany("UPDATE cleaned SET used=? WHERE ing=?",[(now,ing) for ing in found])
+            with self.__hits.get_lock():
+                self.__hits.value += len(found)
+
+        # clean everything missing from both in one call
+        missing = [ing for ing in keys if ing not in found]
+        if missing:
+            bases = cleanmany(missing)
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR REPLACE INTO cleaned VALUES (?,?,?)",[(ing,base,now) for ing,base in zip(missing,bases)])
+            conn.execute("COMMIT")
+            found.update(zip(missing,bases))
+            with self.__misses.get_lock():
+                self.__misses.value += len(missing)
+            self.__inserts += len(missing)
+            if self.__inserts >= TRIM_EVERY:
+                self.__inserts = 0
+                self.trim()
+
+        for ing,idx in todo.items():
+            self.remember(ing,found[ing])
+            for i in idx:
+                out[i] = found[ing]
+        return out
+
+    def remember(self,ing,base):
+        """ This function records an entry in this process's memory, dropping the least recently used one if full
+
+        Parameters:
+            :ing: str; holds the ingredient string
+            :base: str; holds the base ingredient
+        """
+        self.__lru[ing] = base
+        if len(self.__lru) > self.local:
+            self.__lru.popitem(last=False)
+
+    def trim(self):
+        """ This function removes the least recently used entries of the shared store beyond maxsize
+        """
+        self.connect().execute(
+            """DELETE FROM cleaned WHERE ing IN (
+                SELECT ing FROM cleaned ORDER BY used LIMIT MAX((SELECT COUNT(*) FROM cleaned) - ?,0))""",
+            (self.maxsize,))
+
+    def stats(self):
+        """ This function returns the counters of the cache
+
+        Returns a dict holding in-memory hits, shared store hits, misses and the number of stored entries
+        """
+        return {
+            'local_hits':self.__localhits.value,
+            'hits':self.__hits.value,
+            'misses':self.__misses.value,
+            'size':self.connect().execute("SELECT COUNT(*) FROM cleaned").fetchone()[0]
+        }
+
+    def close(self):
+        """ This function trims the shared store, or removes it if it was temporary
+        """
+        if self.temporary:
+            if self.__conn is not None:
+                self.__conn.close()
+            self.__conn = None
+            self.__pid = None
+            for suffix in ('','-wal','-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+        else:
+            self.trim()
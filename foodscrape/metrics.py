@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import cProfile
+from contextlib import contextmanager, nullcontext
+from multiprocessing import get_context, get_all_start_methods
+from foodscrape.linkstore import linkhash
+
+# GLOBAL multiprocessing context shared values and extraction processes are made in, None until first needed
+r_context = None
+
+# GLOBAL constant for the timed stages, each recording a count and total seconds
+TIMERS = ('fetch','parse','getname','getstars','getstuff','getnutri','fastparse','cleaning')
+
+# GLOBAL constant for the plain counters
+COUNTERS = ('pages','bytes','recipes','failed','duplicates','profiled')
+
+# GLOBAL constant for the kinds of scraping error counted
+ERRORS = ('fetch','carousel','card','name','empty_name','rating','ingredients','empty_ingredients','nutrition',
+          'incomplete','empty_ingredient')
+
+# GLOBAL constant for the default directory sampled profiles are written to
+DEFAULT_PROFDIR = 'profiles'
+
+# GLOBAL constant for the prefix of every exported metric name
+PREFIX = 'foodscrape_'
+
+def context():
+    """ This function returns the multiprocessing context shared values and extraction processes are made in
+
+    Values made in it can be passed to forked as well as forkserver workers. The context is forkserver where the
+    platform has it and spawn otherwise, and is only looked up when a run first needs it, so importing foodscrape
+    starts no helper process
+    """
+    global r_context
+    if r_context is None:
+        r_context = get_context('forkserver' if 'forkserver' in get_all_start_methods() else 'spawn')
+    return r_context
+
+class NullMetrics:
+    """ Metrics that record nothing
+
+    The metrics every process records into until a run sets its own Metrics, so that scraping outside a run
+    needs no shared memory. Nothing is ever picked for profiling
+
+    Methods:
+        :timer: context manager doing nothing
+        :add: ignores a counter increment
+        :error: ignores a scraping error
+        :sampled: returns False
+    """
+    profile = 0.0
+
+    def timer(self,name):
+        return nullcontext()
+
+    def add(self,name,amount=1):
+        return None
+
+    def error(self,kind):
+        return None
+
+    def sampled(self,url):
+        return False
+
+class Metrics:
+    """ Process-shared scraping metrics
+
+    Stage timers, counters and error counts by kind, every one a slot of a single array in shared memory, so a copy
+    passed to Pool workers as an initializer argument, like CleaningCache, counts for the whole pool. Snapshots
+    export as json or Prometheus text format. A fraction of recipes, picked by url hash so that the same recipes
+    are picked every run, can be run under cProfile
+
+    Attributes:
+        :profile: float; holds the fraction of recipes profiled
+        :profdir: str; holds the directory profiles are written to, one <url hash>.prof file per recipe
+
+    Methods:
+        :timer: context manager timing a stage
+        :add: increments a counter
+        :error: counts a scraping error by kind
+        :sampled: returns whether a url is picked for profiling
+        :profiled: calls a function under cProfile and writes out its profile
+        :snapshot: returns a dict of every metric
+        :tojson: returns a snapshot as json
+        :toprometheus: returns a snapshot in Prometheus text format
+        :export: writes a snapshot to a file in the format its suffix names
+    """
+    def __init__(self,profile=0.0,profdir=DEFAULT_PROFDIR):
+        self.profile = profile
+        self.profdir = profdir
+        # counts and seconds of every timer, then every counter, then every error kind
+        self.__slots = {}
+        for name in TIMERS:
+            self.__slots[('count',name)] = len(self.__slots)
+            self.__slots[('seconds',name)] = len(self.__slots)
+        for name in COUNTERS:
+            self.__slots[('counter',name)] = len(self.__slots)
+        for kind in ERRORS:
+            self.__slots[('error',kind)] = len(self.__slots)
+        self.__values = context().Array('d',len(self.__slots))
+
+    def bump(self,*pairs):
+        """ This function adds to slots of the shared array under its lock
+
+        Parameter:
+            :pairs: tuple; holds (slot key, amount) pairs
+        """
+        with self.__values.get_lock():
+            for key,amount in pairs:
+                self.__values[self.__slots[key]] += amount
+
+    @contextmanager
+    def timer(self,name):
+        """ This function times the block it wraps as one run of a stage
+
+        Parameter:
+            :name: str; holds the stage, one of TIMERS
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.bump((('count',name),1),(('seconds',name),time.perf_counter() - start))
+
+    def add(self,name,amount=1):
+        """ This function increments a counter
+
+        Parameters:
+            :name: str; holds the counter, one of COUNTERS
+            :amount: int; holds the increment
+        """
+        self.bump((('counter',name),amount))
+
+    def error(self,kind):
+        """ This function counts a scraping error
+
+        Parameter:
+            :kind: str; holds the kind of error, one of ERRORS
+        """
+        self.bump((('error',kind),1))
+
+    def sampled(self,url):
+        """ This function returns whether a recipe is picked for profiling
+
+        Parameter:
+            :url: str; contains recipe webpage
+        """
+        return self.profile > 0 and linkhash(url) < self.profile*2**64
+
+    def profiled(self,url,func,*args):
+        """ This function calls a function under cProfile
+
+        Returns what func returns, and writes the profile to profdir, named after the hash of url
+
+        Parameters:
+            :url: str; contains the recipe webpage the call is for
+            :func: function; holds the function to profile
+            :args: tuple; holds the arguments of func
+        """
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            return func(*args)
+        finally:
+            prof.disable()
+            os.makedirs(self.profdir,exist_ok=True)
+            prof.dump_stats(os.path.join(self.profdir,'{:016x}.prof'.format(linkhash(url))))
+            self.add('profiled')
+
+    def snapshot(self):
+        """ This function returns the current value of every metric
+
+        Returns a dict holding, under timers, the count and seconds of every stage, under counters every counter and
+        under errors the count of every kind of error
+        """
+        with self.__values.get_lock():
+            values = self.__values[:]
+        get = lambda key: values[self.__slots[key]]
+        return {
+            'timers':{name:{'count':int(get(('count',name))),'seconds':get(('seconds',name))} for name in TIMERS},
+            'counters':{name:int(get(('counter',name))) for name in COUNTERS},
+            'errors':{kind:int(get(('error',kind))) for kind in ERRORS}
+        }
+
+    def tojson(self):
+        """ This function returns a snapshot of every metric as json
+        """
+        return json.dumps(dict(self.snapshot(),timestamp=time.time()),indent=2)
+
+    def toprometheus(self):
+        """ This function returns a snapshot of every metric in Prometheus text format
+
+        Stage timers are summaries without quantiles, counters and errors are counters, errors labelled by kind
+        """
+        snap = self.snapshot()
+        lines = [
+            '# HELP {}stage_seconds Seconds spent in each scraping stage'.format(PREFIX),
+            '# TYPE {}stage_seconds summary'.format(PREFIX)
+        ]
+        for name,timer in snap['timers'].items():
+            lines.append('{}stage_seconds_count{{stage="{}"}} {}'.format(PREFIX,name,timer['count']))
+            lines.append('{}stage_seconds_sum{{stage="{}"}} {!r}'.format(PREFIX,name,timer['seconds']))
+        for name,val in snap['counters'].items():
+            lines.append('# TYPE {}{}_total counter'.format(PREFIX,name))
+            lines.append('{}{}_total {}'.format(PREFIX,name,val))
+        lines.append('# HELP {}errors_total Scraping errors by kind'.format(PREFIX))
+        lines.append('# TYPE {}errors_total counter'.format(PREFIX))
+        for kind,val in snap['errors'].items():
+            lines.append('{}errors_total{{kind="{}"}} {}'.format(PREFIX,kind,val))
+        return '\n'.join(lines) + '\n'
+
+    def export(self,path):
+        """ This function writes a snapshot of every metric to a file
+
+        Writes Prometheus text format for a .prom or .txt file and json otherwise
+
+        Parameter:
+            :path: str; holds the path of the snapshot file
+        """
+        text = self.toprometheus() if path.endswith(('.prom','.txt')) else self.tojson()
+        with open(path,'w') as f:
+            f.write(text)
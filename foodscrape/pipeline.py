@@ -0,0 +1,192 @@
+""" Two-stage scraping executor
+
+Fetching a recipe waits on the network while extracting it burns CPU, so the two run as separate stages. A pool of
+fetcher threads in the parent process fetches pages, through the response cache, request scheduler and archive of
+the parent, into a bounded queue. A dispatcher hands queued pages to a pool of extraction processes sized to the
+cores, keeping at most depth pages in it. When extraction falls behind, the queue fills and fetchers block, so
+memory holds at most about two depths of pages whatever the number of recipes. Extraction processes are forked by
+a forkserver that has imported the extraction modules once, or spawned where the platform has no forkserver, so
+they start without the parent's state or imports
+"""
+import os
+import queue
+import logging
+import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from foodscrape import scraping
+from foodscrape.scraping import fetch
+from foodscrape.scraping import scrape_record
+from foodscrape.scraping import use_memo
+from foodscrape.scraping import use_metrics
+from foodscrape.scraping import use_seen
+from foodscrape.metrics import context
+from foodscrape.scheduler import DEFAULT_CONCURRENCY
+
+# GLOBAL logger reporting progress
+log = logging.getLogger(__name__)
+
+# GLOBAL constant for the default number of fetcher threads, as many as the scheduler ever lets in flight to a host so
+# that its adaptive concurrency limit, shared by every thread, is what bounds the requests in flight
+DEFAULT_FETCHERS = DEFAULT_CONCURRENCY[1]
+
+# GLOBAL constant for the modules the forkserver imports once for every extraction process
+PRELOAD = ['foodscrape.scraping','bs4','lxml.html','textblob','nltk.tag.perceptron']
+
+# GLOBAL constant for the seconds a blocked stage waits before checking whether the run was stopped
+POLL = 0.5
+
+def initextractor(memo,metrics,seen):
+    """ This function prepares an extraction process
+
+    Parameters:
+        :memo: CleaningCache; holds the memo of cleaned ingredients
+        :metrics: Metrics; holds the process-shared metrics
+        :seen: SeenSet; holds the fingerprints of recipes already scraped, None to disable deduplication
+    """
+    use_memo(memo)
+    use_metrics(metrics)
+    use_seen(seen)
+
+def extract(item):
+    """ This function extracts one fetched recipe
+
+    Returns the index num of the recipe along with its result, see scrape_record
+
+    Parameter:
+        :item: tuple; holds the index num, url, page html and fast flag of a recipe
+    """
+    num,url,html,fast = item
+    return num,scrape_record(url,html,fast)
+
+def fetchone(url):
+    """ This function fetches one recipe page for the extraction stage
+
+    Returns the page html, or None if the request failed. Any other error is raised
+
+    Parameter:
+        :url: str; contains recipe webpage
+    """
+    try:
+        return fetch(url)
+    except requests.RequestException:
+        scraping.r_metrics.error('fetch')
+        log.warning('Error fetching %s',url)
+        return None
+
+def makepool(processes,initializer,initargs):
+    """ This function starts a pool of extraction processes
+
+    The processes are forked by a forkserver that imported the extraction modules once where the platform has one,
+    and spawned otherwise, in the context shared values of Metrics and CleaningCache are made in
+
+    Parameters:
+        :processes: int; holds the number of processes
+        :initializer: function; holds the function every process runs on start
+        :initargs: tuple; holds the arguments of initializer
+    """
+    ctx = context()
+    if ctx.get_start_method() == 'forkserver':
+        ctx.set_forkserver_preload(PRELOAD)
+    return ctx.Pool(processes,initializer=initializer,initargs=initargs)
+
+def pipeline(urls,memo,metrics,seen=None,fetchers=DEFAULT_FETCHERS,extractors=None,depth=None,fast=False):
+    """ This function scrapes recipes in two stages, fetching on threads and extracting on processes
+
+    Yields the index num of every recipe of urls along with its result, see scrape_record, in the order
+    extraction finishes. The response cache, scheduler and archive set in this process are used for fetching.
+    A failed request, or an error raised while extracting a recipe, fails that recipe, while any other error of
+    the fetching or dispatching threads stops both stages and is raised here. Closing the generator early stops
+    both stages
+
+    Parameters:
+        :urls: list; holds recipe urls
+        :memo: CleaningCache; holds the memo of cleaned ingredients
+        :metrics: Metrics; holds the process-shared metrics
+        :seen: SeenSet; holds the fingerprints of recipes already scraped, None to disable deduplication
+        :fetchers: int; holds the number of pages fetched at a time
+        :extractors: int; holds the number of extraction processes, None for one per core
+        :depth: int; holds the number of fetched pages queued, and separately handed to the extraction processes,
+                at a time, None for two per extraction process
+        :fast: bool; if True, extracts with Recipe.fastparse
+    """
+    extractors = extractors or os.cpu_count()
+    depth = depth or 2*extractors
+    pages = queue.Queue(depth)
+    done = queue.Queue()
+    slots = threading.BoundedSemaphore(depth)
+    stop = threading.Event()
+    todo = iter(enumerate(urls))
+    lock = threading.Lock()
+
+    def guarded(stage):
+        # hand any error of a stage thread to the consuming thread rather than letting the thread die silently
+        def run():
+            try:
+                stage()
+            except Exception as exc:
+                stop.set()
+                done.put(exc)
+        return run
+
+    def fetching():
+        while not stop.is_set():
+            with lock:
+                num,url = next(todo,(None,None))
+            if num is None:
+                return
+            item = (num,url,fetchone(url),fast)
+            # block while the queue is full, the backpressure of the extraction stage
+            while not stop.is_set():
+                try:
+                    pages.put(item,timeout=POLL)
+                    break
+                except queue.Full:
+                    continue
+
+    def finish(result):
+        slots.release()
+        done.put(result)
+
+    def failed(num,url):
+        def handler(exc):
+            log.error('Error extracting %s: %r',url,exc)
+            finish((num,None))
+        return handler
+
+    def dispatching():
+        for _ in range(len(urls)):
+            while not stop.is_set():
+                try:
+                    item = pages.get(timeout=POLL)
+                    break
+                except queue.Empty:
+                    continue
+            else:
+                return
+            num,url,html = item[:3]
+            if html is None:
+                done.put((num,None))
+                continue
+            # block while depth pages are being extracted
+            while not slots.acquire(timeout=POLL):
+                if stop.is_set():
+                    return
+            pool.apply_async(extract,(item,),callback=finish,error_callback=failed(num,url))
+
+    pool = makepool(extractors,initextractor,(memo,metrics,seen))
+    executor = ThreadPoolExecutor(max_workers=fetchers + 1)
+    try:
+        for _ in range(fetchers):
+            executor.submit(guarded(fetching))
+        executor.submit(guarded(dispatching))
+        for _ in range(len(urls)):
+            result = done.get()
+            if isinstance(result,Exception):
+                raise result
+            yield result
+    finally:
+        stop.set()
+        executor.shutdown()
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,237 @@
+import time
+import random
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+# GLOBAL constant for the default requests per second allowed to each host
+DEFAULT_RATE = 5.0
+
+# GLOBAL constant for the default number of requests a host's bucket lets through back to back
+DEFAULT_BURST = 10
+
+# GLOBAL constant for the default connect and read timeouts in seconds
+DEFAULT_TIMEOUT = (5.0,30.0)
+
+# GLOBAL constant for the default number of retries after a failed attempt
+DEFAULT_RETRIES = 4
+
+# GLOBAL constant for the default base and cap in seconds of the jittered exponential backoff
+DEFAULT_BACKOFF = (0.5,30.0)
+
+# GLOBAL constant for the default initial and maximum number of requests in flight to each host
+DEFAULT_CONCURRENCY = (4,32)
+
+# GLOBAL constant for the status codes treated as the host being overloaded, and retried
+RETRY_STATUS = {429,500,502,503,504}
+
+class TokenBucket:
+    """ Thread-safe token bucket rate limiter
+
+    Attributes:
+        :rate: float; holds the tokens added per second
+        :burst: float; holds the maximum number of tokens
+
+    Methods:
+        :take: blocks until a token is available and takes it
+    """
+    def __init__(self,rate,burst):
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = burst
+        self.__stamp = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def take(self):
+        """ This function takes a token, sleeping until one is available
+        """
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.burst,self.__tokens + (now - self.__stamp)*self.rate)
+                self.__stamp = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens)/self.rate
+            time.sleep(wait)
+
+class Limiter:
+    """ Adaptive limit on the number of requests in flight
+
+    The limit grows by about one per limit's worth of fast successful requests and halves whenever a request
+    fails, is throttled or takes more than twice the best latency seen recently (additive increase, multiplicative
+    decrease)
+
+    Attributes:
+        :limit: float; holds the current number of requests allowed in flight
+        :minimum: int; holds the lowest limit
+        :maximum: int; holds the highest limit
+
+    Methods:
+        :acquire: blocks until a request may start
+        :release: records the outcome of a finished request and adapts the limit
+    """
+    def __init__(self,initial,maximum,minimum=1):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.__inflight = 0
+        self.__baseline = None
+        self.__cond = threading.Condition()
+
+    def acquire(self):
+        """ This function waits until fewer than limit requests are in flight and counts one more
+        """
+        with self.__cond:
+            while self.__inflight >= int(self.limit):
+                self.__cond.wait()
+            self.__inflight += 1
+
+    def release(self,latency,ok):
+        """ This function counts a request as finished and adapts the limit
+
+        Parameters:
+            :latency: float; holds the seconds the request took
+            :ok: bool; holds whether the request succeeded without throttling
+        """
+        with self.__cond:
+            self.__inflight -= 1
+            # track a slowly forgetting minimum of latencies as the uncongested baseline
+            if self.__baseline is None or latency < self.__baseline:
+                self.__baseline = latency
+            else:
+                self.__baseline += 0.01*(latency - self.__baseline)
+
+            if not ok:
+                self.limit = max(self.minimum,self.limit/2)
+            elif latency > 2*self.__baseline:
+                self.limit = max(self.minimum,self.limit*0.9)
+            else:
+                self.limit = min(self.maximum,self.limit + 1/self.limit)
+            self.__cond.notify_all()
+
+class RequestScheduler:
+    """ Polite, fault tolerant GET requests over a shared session
+
+    Every host gets its own token bucket and adaptive concurrency limit. Requests time out, and connection errors,
+    timeouts, 429 and 5xx answers are retried a bounded number of times after a jittered exponential backoff that
+    honours Retry-After. The session's connection pools are sized to the maximum concurrency. Limits apply per
+    process, so a Pool of n workers sharing a budget should each get rate/n
+
+    Attributes:
+        :session: Session; holds the requests session
+        :rate: float; holds the requests per second allowed to each host
+        :burst: int; holds the requests a host's bucket lets through back to back
+        :timeout: tuple; holds the connect and read timeouts in seconds
+        :retries: int; holds the number of retries after a failed attempt
+        :backoff: tuple; holds the base and cap in seconds of the backoff
+        :concurrency: tuple; holds the initial and maximum requests in flight to each host
+        :stats: dict; holds counts of requests, retries and failures
+
+    Methods:
+        :get: performs a GET request with rate limiting, timeouts and retries
+    """
+    def __init__(self,session=None,rate=DEFAULT_RATE,burst=DEFAULT_BURST,timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES,backoff=DEFAULT_BACKOFF,concurrency=DEFAULT_CONCURRENCY):
+        self.session = session if session is not None else requests.Session()
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.stats = {'requests':0,'retries':0,'failures':0}
+        self.__hosts = {}
+        self.__lock = threading.Lock()
+        # size connection pools so every request the limiters allow in flight can keep its connection
+        adapter = HTTPAdapter(pool_connections=concurrency[1],pool_maxsize=concurrency[1],max_retries=0)
+        self.session.mount('http://',adapter)
+        self.session.mount('https://',adapter)
+
+    def host(self,url):
+        """ This function returns the token bucket and limiter of a url's host, creating them if needed
+
+        Parameter:
+            :url: str; contains webpage
+        """
+        netloc = urlsplit(url).netloc.lower()
+        with self.__lock:
+            if netloc not in self.__hosts:
+                self.__hosts[netloc] = (TokenBucket(self.rate,self.burst),Limiter(*self.concurrency))
+            return self.__hosts[netloc]
+
+    def count(self,key):
+        """ This function increments one of the stats counters
+
+        Parameter:
+            :key: str; holds the name of the counter
+        """
+        with self.__lock:
+            self.stats[key] += 1
+
+    def limit(self,url):
+        """ This function returns the current concurrency limit of a url's host
+
+        Parameter:
+            :url: str; contains webpage
+        """
+        return self.host(url)[1].limit
+
+    def delay(self,attempt,r=None):
+        """ This function returns the seconds to wait before a retry
+
+        Full jitter over an exponentially growing window, but never less than a Retry-After given in seconds
+
+        Parameters:
+            :attempt: int; holds the number of the failed attempt, from 0
+            :r: Response; holds the failed response, None if no response arrived
+        """
+        base,cap = self.backoff
+        wait = random.uniform(0,min(cap,base*2**attempt))
+        if r is not None:
+            try:
+                wait = max(wait,min(cap,float(r.headers.get('Retry-After',0))))
+            except ValueError:
+                pass
+        return wait
+
+    def get(self,url,headers=None):
+        """ This function performs a GET request
+
+        Returns the response. A 429 or 5xx answer still standing after every retry is returned as is, while a
+        connection error or timeout still standing is raised. Any other request error is raised at once
+
+        Parameters:
+            :url: str; contains webpage
+            :headers: dict; holds extra request headers
+        """
+        bucket,limiter = self.host(url)
+        for attempt in range(self.retries+1):
+            bucket.take()
+            limiter.acquire()
+            self.count('requests')
+            start = time.monotonic()
+            ok = False
+            # release the slot whatever happens, or an error escaping here would hold it forever
+            try:
+                r = self.session.get(url,headers=headers,timeout=self.timeout)
+                ok = r.status_code not in RETRY_STATUS
+            except (requests.ConnectionError,requests.Timeout):
+                if attempt == self.retries:
+                    self.count('failures')
+                    raise
+                r = None
+            except requests.RequestException:
+                self.count('failures')
+                raise
+            finally:
+                limiter.release(time.monotonic() - start,ok)
+            if ok:
+                return r
+            if attempt == self.retries:
+                self.count('failures')
+                return r
+            self.count('retries')
+            time.sleep(self.delay(attempt,r))
@@ -1,34 +1,393 @@
+import re
+import json
+import logging
 import requests
-from re import search
+from array import array
+from html import unescape
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from bs4 import BeautifulSoup
-from textblob import TextBlob as tb
+from lxml import etree, html as lxhtml
+from foodscrape.linkstore import LinkStore
+from foodscrape.cache import ResponseCache
+from foodscrape.archive import PageArchive
+from foodscrape.dedup import canonical, fingerprint
+from foodscrape.scheduler import RequestScheduler
+from foodscrape.metrics import NullMetrics
+
+# GLOBAL logger reporting scraping errors
+log = logging.getLogger(__name__)
 
 # GLOBAL request session store to reuse connections
 r_sesh = requests.Session()
 
+# GLOBAL request scheduler rate limiting, timing out and retrying every request made over r_sesh
+r_sched = RequestScheduler(r_sesh)
+
+# GLOBAL on-disk response cache behind makesoup, None while caching is disabled
+r_cache = None
+
+# GLOBAL archive every fetched page is recorded into, None while recording is disabled
+r_archive = None
+
+# GLOBAL process-shared memo of cleaned ingredients behind Recipe.cleaning, None while memoization is disabled
+r_memo = None
+
+# GLOBAL process-shared set of recipe fingerprints checked before cleaning, None while deduplication is disabled
+r_seen = None
+
+# GLOBAL part of speech tagger of this process, None until the first ingredients are tagged
+r_tagger = None
+
+# GLOBAL process-shared metrics recording stage timings, counts and errors, recording nothing until use_metrics
+r_metrics = NullMetrics()
+
 # GLOBAL constant for default scraping quantity
 DEFAULT_QUANT = 1000
 
+# GLOBAL constant for the root of the recipe type tree, the page every crawl starts from
+ROOT_URL = "https://www.allrecipes.com/recipes/"
+
+# GLOBAL constant for the prefix of gallery pages, which the crawl skips
+GALLERY_URL = "https://www.allrecipes.com/gallery/"
+
+# GLOBAL constant for default number of in-flight requests in a breadth-first crawl
+DEFAULT_WORKERS = 8
+
+# GLOBAL precompiled pattern for the json-ld blocks embedded in recipe pages
+LDJSON = re.compile(rb'<script[^>]*application/ld\+json[^>]*>(.*?)</script>',re.S|re.I)
+
+# GLOBAL precompiled XPath queries, each matching the BeautifulSoup search of the corresponding Recipe extractor
+XNAME = etree.XPath("//h1[@class='headline heading-content']")
+XSTARS = etree.XPath("//body//*[@data-ratings-average]/@data-ratings-average")
+XSTUFF = etree.XPath("//body//span[contains(concat(' ',normalize-space(@class),' '),' ingredients-item-name ')]")
+XNUTRI = etree.XPath("//span[contains(concat(' ',normalize-space(@class),' '),' nutrient-name ')]")
+
+# GLOBAL translation table replacing non-ascii numerals and spaces, see Recipe.convertedstr
+UNWANTED = str.maketrans({
+    '\u2009':' ',
+    '\u00bc':'1/4',
+    '\u00bd':'1/2',
+    '\u00be':'3/4',
+    '\u2153':'1/3',
+    '\u2154':'2/3',
+    '\u2155':'1/5',
+    '\u2156':'2/5',
+    '\u2157':'3/5',
+    '\u2158':'4/5',
+    '\u2159':'1/6',
+    '\u215a':'5/6',
+    '\u215b':'1/8',
+    '\u215c':'3/8',
+    '\u215d':'5/8',
+    '\u215e':'7/8',
+    '\u0026':'&',
+    '-':' '
+})
+
+# GLOBAL precompiled keyword patterns parsed out of ingredient strings, see Recipe.stripkeys
+KEYS = [re.compile(key) for key in [
+    r'\([\w ]*\)',
+    r'[Oo]ptional',
+    r'[Wa]rm',
+    r'[Rr]oom [Tt]emperature',
+    r'[Pp]ackage',
+    r'[Ss]tiffly [Bb]eaten',
+    r'[Ff]rying',
+    r'[Tt]ablespoons?',
+    r'[Tt]easpoons?',
+    r'[Ss]uch'
+]]
+
+# GLOBAL standardization map from nutrition names as listed on recipe pages to their standardized names
+STANDARD = {
+    "fat":"Total Fat",
+    "saturated fat":"Saturated Fat",
+    "cholesterol":"Cholesterol",
+    "sodium":"Sodium",
+    "potassium":"Potassium",
+    "carbohydrates":"Total Carbohydrates",
+    "dietary fiber":"Dietary Fiber",
+    "protein":"Protein",
+    "sugars":"Sugars",
+    "vitamin a iu":"Vitamin A",
+    "vitamin c":"Vitamin C",
+    "calcium":"Calcium",
+    "iron":"Iron",
+    "thiamin":"Thiamin",
+    "niacin equivalents":"Niacin",
+    "niacin equivilants":"Niacin",
+    "vitamin b6":"Vitamin B6",
+    "magnesium":"Magnesium",
+    "folate":"Folate",
+    "vitamin c":"Vitamin C",
+    "calories from fat":"Cals from Fat"
+}
+
+# GLOBAL constant for the fixed order of standardized nutrition names, used as nutrition columns
+NUTRIENTS = list(dict.fromkeys(STANDARD.values()))
+
+# GLOBAL unit every standardized nutrition value is normalized to
+UNITS = {
+    "Total Fat":"g",
+    "Saturated Fat":"g",
+    "Cholesterol":"mg",
+    "Sodium":"mg",
+    "Potassium":"mg",
+    "Total Carbohydrates":"g",
+    "Dietary Fiber":"g",
+    "Protein":"g",
+    "Sugars":"g",
+    "Vitamin A":"IU",
+    "Vitamin C":"mg",
+    "Calcium":"mg",
+    "Iron":"mg",
+    "Thiamin":"mg",
+    "Niacin":"mg",
+    "Vitamin B6":"mg",
+    "Magnesium":"mg",
+    "Folate":"mcg",
+    "Cals from Fat":"kcal"
+}
+
+# GLOBAL constant for the grams in every mass unit found on recipe pages
+MASS = {'g':1.0,'mg':1e-3,'mcg':1e-6,'\u00b5g':1e-6,'ug':1e-6}
+
+# GLOBAL precompiled pattern for a nutrition value, a number with an optional unit or percent sign
+NUTRIVALUE = re.compile(r'(\d[\d,]*(?:\.\d*)?|\.\d+)\s*([a-z\u00b5%]*)',re.I)
+
+# GLOBAL constant for a row of nutrition values none of which is listed
+NOVALUES = array('f',[float('nan')])*len(NUTRIENTS)
+
+def unitfactors(unit):
+    """ This function returns the factors converting values in the units found on recipe pages to the given unit
+
+    A mass must be given with its unit. Any other value, such as calories or international units, may be given
+    without one and is then taken to be in the given unit already. A percent of the daily value is never converted
+
+    Parameter:
+        :unit: str; holds the unit converted to, one of the values of UNITS
+    """
+    if unit in MASS:
+        return {u:w/MASS[unit] for u,w in MASS.items()}
+    return {'':1.0,unit.lower():1.0}
+
+# GLOBAL precompiled schema from every nutrition name, as listed on recipe pages or standardized and lowercased,
+# to its column in NUTRIENTS and its unit conversion factors
+SCHEMA = {listed:(NUTRIENTS.index(name),unitfactors(UNITS[name]))
+          for listed,name in list(STANDARD.items()) + [(name.lower(),name) for name in NUTRIENTS]}
+
+# GLOBAL map from schema.org NutritionInformation properties to the nutrition names shown on recipe pages
+LDNUTRI = {
+    "fatContent":"fat",
+    "saturatedFatContent":"saturated fat",
+    "cholesterolContent":"cholesterol",
+    "sodiumContent":"sodium",
+    "carbohydrateContent":"carbohydrates",
+    "fiberContent":"dietary fiber",
+    "proteinContent":"protein",
+    "sugarContent":"sugars"
+}
+
+def use_cache(directory='cache',**kwargs):
+    """ This function enables or disables the response cache used by makesoup
+
+    Takes the root directory of an on-disk ResponseCache, or None to disable caching. Also usable as a Pool
+    initializer so that every worker process opens the same cache
+
+    Parameters:
+        :directory: str; holds the cache directory, None to disable caching
+        :kwargs: dict; holds ttl, max_age and max_bytes settings passed to ResponseCache
+    """
+    global r_cache
+    r_cache = ResponseCache(directory,**kwargs) if directory else None
+
+def use_archive(path='data/pages.warc.gz'):
+    """ This function enables or disables recording of fetched pages
+
+    Takes the path of a PageArchive every page fetched successfully from now on is appended to, or None to stop
+    recording. Also usable as a Pool initializer so that every worker process records into the same archive
+
+    Parameter:
+        :path: str; holds the path of the archive, None to disable recording
+    """
+    global r_archive
+    r_archive = PageArchive(path) if path else None
+
+def use_scheduler(**settings):
+    """ This function replaces the request scheduler used by makesoup
+
+    Creates a new RequestScheduler over r_sesh with the given settings. Every request of the process goes through
+    it, so the threads fetching pages share its rate limits and adaptive concurrency limits
+
+    Parameter:
+        :settings: dict; holds rate, burst, timeout, retries, backoff and concurrency settings passed to RequestScheduler
+    """
+    global r_sched
+    r_sched = RequestScheduler(r_sesh,**settings)
+
+def use_memo(memo):
+    """ This function enables or disables the memo of cleaned ingredients used by Recipe.cleaning
+
+    Takes a CleaningCache, or None to disable memoization. Also usable as a Pool initializer so that every
+    worker process shares the same memo and counters
+
+    Parameter:
+        :memo: CleaningCache; holds the memo of cleaned ingredients, None to disable memoization
+    """
+    global r_memo
+    r_memo = memo
+
+def use_seen(seen):
+    """ This function enables or disables skipping of recipes whose content was already seen under another url
+
+    Takes a SeenSet, or None to disable deduplication. Also usable as a Pool initializer so that every worker
+    process checks the same set. A recipe claims its fingerprint in scrape_record once it is scraped without error,
+    so a failed copy never hides a later valid one
+
+    Parameter:
+        :seen: SeenSet; holds the set of recipe fingerprints, None to disable deduplication
+    """
+    global r_seen
+    r_seen = seen
+
+def use_metrics(metrics):
+    """ This function replaces the metrics recorded by fetching, parsing and cleaning
+
+    Also usable as a Pool initializer so that every worker process counts into the same shared metrics
+
+    Parameter:
+        :metrics: Metrics; holds the process-shared metrics
+    """
+    global r_metrics
+    r_metrics = metrics
+
+def fetch(url):
+    """ This function fetches the html of a webpage
+
+    Returns the raw page content, going through the response cache when one is enabled and the request scheduler.
+    When recording is enabled, a page the network answered with a 200 is recorded in the archive, as is a page
+    served by the cache that the archive does not hold yet; error answers are never recorded
+    :url: str; contains webpage
+    """
+    statuses = []
+    def get(url,headers=None):
+        r = r_sched.get(url,headers=headers)
+        statuses.append(r.status_code)
+        return r
+
+    with r_metrics.timer('fetch'):
+        if r_cache is not None:
+            html = r_cache.fetch(url,get)
+        else:
+            html = get(url).content
+    r_metrics.add('pages')
+    r_metrics.add('bytes',len(html))
+    if r_archive is not None:
+        # no answer, or a 304, means the page came from the cache
+        status = statuses[-1] if statuses else 304
+        if status == 200 or (status == 304 and url not in r_archive):
+            r_archive.add(url,html)
+    return html
+
 def makesoup(url):
     """ This function makes a soup object
 
     This function takes a url and returns a BeautifulSoup object from it containing webpage html
     :url: str; contains webpage
     """
-    html = r_sesh.get(url).content
-    return BeautifulSoup(html,"lxml")
+    html = fetch(url)
+    with r_metrics.timer('parse'):
+        return BeautifulSoup(html,"lxml")
 
-def scrape_links(quant=DEFAULT_QUANT):
+def ldrecipe(html):
+    """ This function finds the structured recipe data of a page
+
+    Returns the dict of the first schema.org Recipe found in the page's application/ld+json blocks, or None.
+    Works on the raw html so that no tree is built
+
+    Parameter:
+        :html: bytes; holds the page html
+    """
+    if isinstance(html,str):
+        html = html.encode('utf-8')
+    for block in LDJSON.findall(html):
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        items = data if isinstance(data,list) else data.get('@graph',[data]) if isinstance(data,dict) else []
+        for item in items:
+            if not isinstance(item,dict):
+                continue
+            kind = item.get('@type')
+            if kind == 'Recipe' or (isinstance(kind,list) and 'Recipe' in kind):
+                return item
+    return None
+
+def tagger():
+    """ This function returns the NLTK part of speech tagger of this process
+
+    The tagger, and TextBlob and NLTK themselves, are loaded on first use, so that processes that never clean
+    ingredients never load them, and once per process rather than once per batch as pos_tag_sents does
+    """
+    global r_tagger
+    if r_tagger is None:
+        from nltk.tag.perceptron import PerceptronTagger
+        r_tagger = PerceptronTagger()
+    return r_tagger
+
+def tagbatch(strings):
+    """ This function tags the parts of speech of a batch of strings
+
+    Returns, for every string, the word,part of speech tuples that TextBlob(string).tags gives. The tokens of every
+    string are tagged as one sequence, so that the tagger keeps its context across abbreviations such as "tsp.",
+    and every string is tagged by the tagger of this process in one tag_sents call instead of one tagger per string
+
+    Parameter:
+        :strings: list; holds the strings to tag
+    """
+    from textblob import TextBlob as tb
+    from textblob.utils import PUNCTUATION_REGEX
+    tagged = tagger().tag_sents([list(tb(string).tokens) for string in strings])
+    # drop punctuation the same way TextBlob does
+    return [[(str(word),part) for word,part in tags if not PUNCTUATION_REGEX.match(part)] for tags in tagged]
+
+def nutrivalue(val,factors):
+    """ This function parses a nutrition value such as "12.5g" or "1,340 mg" into a float in its column's unit
+
+    Returns NaN if val holds no number, or a unit not in factors such as a missing mass unit or a percent
+
+    Parameters:
+        :val: str; holds the value as listed
+        :factors: dict; holds the conversion factor of every known unit, see unitfactors
+    """
+    m = NUTRIVALUE.search(val)
+    if m is None:
+        return float('nan')
+    return float(m.group(1).replace(',',''))*factors.get(m.group(2).lower(),float('nan'))
+
+def xtext(el):
+    """ This function returns the text of an lxml element the way get_text(strip=True) would
+
+    Parameter:
+        :el: Element; holds the lxml element
+    """
+    return ''.join(t.strip() for t in el.itertext())
+
+def scrape_links(quant=DEFAULT_QUANT,workers=DEFAULT_WORKERS):
     """ Create the master list of recipes
     
     Creates an AllRecipeBook instance for allrecipes.com/recipes and returns the created linklist with the desired number of recipes
 
-    Parameter:
+    Parameters:
         :quant: int, holds the desired number of recipes to scrape
+        :workers: int; holds the number of in-flight requests for a breadth-first crawl, None for the recursive crawl
     """
+    book = AllRecipeBook(ROOT_URL,quant,workers)
     if quant != float('inf'):
-        return AllRecipeBook("https://www.allrecipes.com/recipes/",quant).linklist[:quant]
-    return AllRecipeBook("https://www.allrecipes.com/recipes/",quant).linklist
+        return book.linklist[:quant]
+    return book.linklist
 
 class AllRecipeBook:
     """ Data store for url links to allrecipes.com recipes
@@ -38,23 +397,32 @@ class AllRecipeBook:
     Attributes:
     visited     -- set; holds the names of subcategories that have been processed
     linklist    -- list; holds the urls of recipes that have been processed
+    store       -- LinkStore; holds the indexed "links.txt" store of every url processed in this or previous runs
 
     Methods:
-    __init__    -- initializes the recipebook's data fields and calls the makebook method
+    __init__    -- initializes the recipebook's data fields and calls the makebook or crawl method
     findall     -- returns a list of urls of either carousel recipe types or card recipes
     makebook    -- this function recurses down recipe type tree to extract all urls and append them to link file
+    crawl       -- this function walks the recipe type tree breadth-first with several requests in flight
     """
-    def __init__(self,url,quant):
+    def __init__(self,url,quant,workers=None):
         self.quant = quant
         self.linklist = []
         self.visited = set()
-        # prepopulate visited list with links from previous runs to speed up initial computation
-        self.prepopulate_links()
-        # if the previous runs haven't scraped sufficient data, add to desired quantity
-        if len(self.linklist) < self.quant:
-            self.makebook(url)
+        self.store = LinkStore('links.txt')
+        # write out any links still buffered by the store, even if the crawl is interrupted
+        with self.store:
+            # prepopulate visited list with links from previous runs to speed up initial computation
+            self.prepopulate_links()
+            # if the previous runs haven't scraped sufficient data, add to desired quantity
+            if len(self.linklist) < self.quant:
+                if workers:
+                    self.crawl(url,workers)
+                else:
+                    self.makebook(url)
 
-    def findall(self,soup):
+    @staticmethod
+    def findall(soup):
         """ This function returns the next set of subcategories or recipes
         returns a tuple holding names of subcategories/recipes and the associated list of urls
 
@@ -67,8 +435,8 @@ class AllRecipeBook:
                 carousel_names = [s.get_text(strip=True) for s in soup.body.find_all("div",class_="carouselNav__linkText")]
                 return carousel_names,carousel_links
         except:
-            print('Attempted to access empty carousel')
-            print(soup.name)
+            r_metrics.error('carousel')
+            log.warning('Attempted to access empty carousel %s',soup.name)
             return -1,-1
 
         # if no more subcategories to travel down, find all recipe card links
@@ -76,8 +444,8 @@ class AllRecipeBook:
             card_links = [l.get('href') for l in soup.body.find_all("a",class_="card__titleLink manual-link-behavior")]
             return None,card_links
         except:
-            print('Attempeted to access bad recipe card')
-            print(soup.name)
+            r_metrics.error('card')
+            log.warning('Attempted to access bad recipe card %s',soup.name)
             return -1,-1
 
     def makebook(self,url):
@@ -92,12 +460,8 @@ class AllRecipeBook:
         if len(self.linklist) > self.quant:
             return
 
-        # if url is gallery type, then skip completely
-        if url.find("https://www.allrecipes.com/gallery/") != -1:
-            return
-
-        # if url is in linklist, then skip completely
-        if url in self.linklist:
+        # if url is gallery type or is in linklist, then skip completely
+        if self.skippable(url):
             return
 
         # create soup for current url page
@@ -116,45 +480,121 @@ class AllRecipeBook:
             for name,sub in zip(names,links):
                 if name not in self.visited:
                     self.visited.add(name)
-                    self.makebook(sub)
+                    self.makebook(canonical(sub))
 
         # if no more subcategories, gather all recipe links
         else:
-            for l in links:
-                if link not in self.linklist:
-                    self.linklist.append(link)
-                    self.save_link(link)
+            for link in links:
+                self.addlink(link)
+
+    def crawl(self,url,workers=DEFAULT_WORKERS):
+        """ This function creates the master list of links to all recipes breadth-first
+
+        This method keeps an explicit frontier of subcategory urls and fetches up to workers pages at a time
+        on a thread pool, each thread parsing its own page, until the frontier runs dry or the desired quantity is reached
+
+        Parameters:
+            :url: string holding url link to the webpage the crawl starts from
+            :workers: int; holds the maximum number of requests in flight
+        """
+        frontier = deque([url])
+        pending = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while (frontier or pending) and len(self.linklist) < self.quant:
+                # keep the pool saturated with pages from the front of the frontier
+                while frontier and len(pending) < workers:
+                    sub = frontier.popleft()
+                    if not self.skippable(sub):
+                        pending.add(executor.submit(self.fetchpage,sub))
+                if not pending:
+                    continue
+                done,pending = wait(pending,return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    names,links = future.result()
+                    # if returns -1, then skip completely
+                    if names == -1:
+                        continue
+                    # if subcategories exist, queue up every one not yet visited
+                    if names is not None:
+                        for name,sub in zip(names,links):
+                            if name not in self.visited:
+                                self.visited.add(name)
+                                frontier.append(canonical(sub))
+                    # if no more subcategories, gather recipe links until the desired quantity is reached
+                    else:
+                        for link in links:
+                            if len(self.linklist) >= self.quant:
+                                break
+                            self.addlink(link)
+
+            # once the desired quantity is reached, drop every page that has not started yet
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def fetchpage(url):
+        """ This function fetches and parses a single page of the recipe type tree
+
+        Returns the tuple from findall for the page at url, or -1,-1 should the request fail. Safe to call from worker
+        threads, and without a book, as the distributed crawl does
+
+        Parameter:
+            :url: string holding url link to webpage of next subcategory or recipe
+        """
+        try:
+            soup = makesoup(url)
+        except requests.RequestException:
+            r_metrics.error('fetch')
+            log.warning('Failed to fetch page %s',url)
+            return -1,-1
+        soup.name = url
+        names,links = AllRecipeBook.findall(soup)
+        soup.decompose()
+        return names,links
+
+    def skippable(self,url):
+        """ This function reports whether a url should not be crawled
+
+        Returns True for gallery pages and for urls already recorded in linklist
+
+        Parameter:
+            :url: string holding url link to webpage of next subcategory or recipe
+        """
+        return url.find(GALLERY_URL) != -1 or url in self.store
+
+    def addlink(self,link):
+        """ This function records a recipe link in linklist and "links.txt" if its canonical form is new
+
+        Parameter:
+            :link: str; contains recipe url
+        """
+        link = canonical(link)
+        if link not in self.store:
+            self.linklist.append(link)
+            self.save_link(link)
 
     def prepopulate_links(self,num=0,stop=None):
         """ If "links.txt" exists, prepopulates master lists to avoid unnecessary complications
         
         This function takes in the visited list and linklist and appends every link stored in
-        "links.txt"
+        "links.txt" between the given line numbers, read straight from the store's offset index
 
         Parameters:
             :num: int; holds starting line number, 0 by default
             :stop: int; holds the ending line number, None by default
         """
-        with open('links.txt','r') as f:
-            for i in range(num):
-                f, next()
-            for i,line in enumerate(f):
-                if stop != None:
-                    if i >= stop:
-                        f.close()
-                        return
-                self.linklist.append(str(line).strip())
-            f.close()
+        self.linklist.extend(self.store.range(num,stop))
 
     def save_link(self,link):
         """ This function handles writing of data to "links.txt"
 
+        Links are buffered by the store and appended in synced batches
+
         Parameter:
             :link: str; contains recipe url
         """
-        with open('links.txt','a') as f:
-            f.write('{}\n'.format(link))
-            f.close()
+        self.store.add(link)
 
 class Recipe:
     """ Data store for important features of a recipe
@@ -166,22 +606,41 @@ class Recipe:
         :name: string; holds the title of the recipe
         :rating: float; holds the average rating of the recipe
         :ingredients: set; holds all of the listed ingredients of recipe as well as their quantities
-        :nutrition: dict; holds nutrition name:value pairs
+        :nutrition: array; holds float32 nutrition values in NUTRIENTS order and UNITS, NaN where not listed
+        :url: string; holds the url of the recipe
+        :duplicate: string; holds the url the same recipe was first seen at, None unless this recipe is a duplicate
+        :fingerprint: int; holds the content fingerprint of the recipe, None while deduplication is disabled
 
     Methods:
         :getname: returns a string holding title of the recipe
         :getstars: returns a float holding average 5-star rating
         :getstuff: returns a set of ingredients listed in the recipe
-        :getnutri: returns a dict of nutrition name;value pairs 
+        :getnutri: returns an array of nutrition values
         :geterr: returns a boolean indicating if any scraping error occured
+        :fastparse: fills every attribute from json-ld data or lxml XPath queries instead of a soup
     """
-    def __init__(self,url,debug=False):
+    def __init__(self,url,debug=False,fast=False,html=None):
         self.__debug = debug
-        self.__soup = makesoup(url)
-        self.name = self.getname()
-        self.rating = self.getstars()
-        self.ingredients = self.getstuff()
-        self.nutrition = self.getnutri()
+        self.url = url
+        self.duplicate = None
+        self.fingerprint = None
+        if html is None:
+            html = fetch(url)
+        # in fast mode skip BeautifulSoup entirely
+        if fast:
+            with r_metrics.timer('fastparse'):
+                self.fastparse(html)
+            return
+        with r_metrics.timer('parse'):
+            self.__soup = BeautifulSoup(html,"lxml")
+        with r_metrics.timer('getname'):
+            self.name = self.getname()
+        with r_metrics.timer('getstars'):
+            self.rating = self.getstars()
+        with r_metrics.timer('getstuff'):
+            self.ingredients = self.getstuff()
+        with r_metrics.timer('getnutri'):
+            self.nutrition = self.getnutri()
         self.__soup.decompose()
     
     def getname(self):
@@ -193,14 +652,16 @@ class Recipe:
         try:
             name = self.__soup.find("h1",class_='headline heading-content').get_text(strip=True)
         except:
+            r_metrics.error('name')
             if self.__debug:
-                print("Error getting name")
+                log.warning("Error getting name")
             return None
         if name:
             return name
         else:
+            r_metrics.error('empty_name')
             if self.__debug:
-                print("Empty name")
+                log.warning("Empty name")
             return None
 
     def getstars(self):
@@ -213,40 +674,112 @@ class Recipe:
             stars = float(self.__soup.body.find(attrs={"data-ratings-average":True})['data-ratings-average'])
             return stars
         except:
+            r_metrics.error('rating')
             if self.__debug:
-                print("Error getting rating")
+                log.warning("Error getting rating")
             return None
 
     def getstuff(self):
         """ This function fetches the listed ingredients of the recipe
         returns a set containing the listed ingredients
         """
-        # initialize output set of ingredients
-        out = set()
-
         # try to scrape for all ingredients, otherwise return None
         try:
             ings = [s.get_text(strip=True) for s in self.__soup.body.find_all("span",class_='ingredients-item-name')]
-
-            # iterate over all ingredients and clean the string of extraneous wording
-            for ing in ings:
-                # if any string contains non-ascii characters, replace them
-                if not ing.isascii():
-                    ing = self.convertedstr(ing)
-                # call cleaning routine and add output string to set of ingredients, otherwise return None for error
-                out.add(self.cleaning(ing))
-
-            return out
-    
+            # if scrape succeds but empty, return None
+            if not ings:
+                r_metrics.error('empty_ingredients')
+                if self.__debug:
+                    log.warning("Empty ingredients")
+                return None
+            return self.cleanset(ings)
         except:
+            r_metrics.error('ingredients')
             if self.__debug:
-                print("Error getting ingredients")
+                log.warning("Error getting ingredients")
             return None
-        # if scrape succeds but empty, return None
-        if not ings:
+
+    def cleanset(self,ings):
+        """ This function cleans every listed ingredient of the recipe
+
+        Returns a set holding the base ingredient of every ingredient string. When deduplication is enabled, the
+        title and ingredient strings are fingerprinted first, and a recipe whose fingerprint another url already
+        claimed is marked as a duplicate and returns None without cleaning anything. Nothing is claimed here
+
+        Parameter:
+            :ings: list; holds the ingredient strings as listed on the page
+        """
+        if r_seen is not None:
+            self.fingerprint = fingerprint(self.name,ings)
+            first = r_seen.first(self.fingerprint)
+            if first is not None and first != self.url:
+                self.duplicate = first
+                return None
+        # if any string contains non-ascii characters, replace them
+        ings = [ing if ing.isascii() else self.convertedstr(ing) for ing in ings]
+        # clean all strings of extraneous wording in one batch and add output strings to set of ingredients
+        out = set(self.cleanbatch(ings))
+        if None in out:
+            r_metrics.error('empty_ingredient')
             if self.__debug:
-                print("Empty ingredients")
-            return None
+                log.warning('Empty ingredient pulled')
+        return out
+
+    def fastparse(self,html):
+        """ This function fills the recipe attributes without building a BeautifulSoup tree
+
+        If the page embeds a json-ld Recipe, name, rating, ingredients and nutrition are read from it and no tree
+        is built at all. Otherwise the page is parsed by lxml alone and each attribute is read with a precompiled
+        XPath query matching the search of the corresponding extractor
+
+        Parameter:
+            :html: bytes; holds the page html
+        """
+        data = ldrecipe(html)
+        if data is not None:
+            self.name = unescape(str(data.get('name') or '')).strip() or None
+            try:
+                self.rating = float(data['aggregateRating']['ratingValue'])
+            except:
+                self.rating = None
+            try:
+                self.ingredients = self.cleanset([unescape(i).strip() for i in data['recipeIngredient']])
+            except:
+                self.ingredients = None
+            try:
+                pairs = [(LDNUTRI[k],v.replace(' ','')) for k,v in data['nutrition'].items() if k in LDNUTRI]
+                self.nutrition = self.nutripairs([k for k,v in pairs],[v for k,v in pairs])
+            except:
+                self.nutrition = None
+            # a duplicate is left without ingredients on purpose and is not a parse failure
+            if self.duplicate is None and self.geterr():
+                r_metrics.error('incomplete')
+                if self.__debug:
+                    log.warning("Incomplete json-ld recipe data")
+            return
+
+        tree = lxhtml.fromstring(html)
+        try:
+            self.name = xtext(XNAME(tree)[0]) or None
+        except:
+            self.name = None
+        try:
+            self.rating = float(XSTARS(tree)[0])
+        except:
+            self.rating = None
+        try:
+            self.ingredients = self.cleanset([xtext(s) for s in XSTUFF(tree)])
+        except:
+            self.ingredients = None
+        try:
+            pairs = [xtext(s) for s in XNUTRI(tree)]
+            self.nutrition = self.nutripairs([s[:s.find(':')] for s in pairs],[s[s.find(':')+1:] for s in pairs])
+        except:
+            self.nutrition = None
+        if self.duplicate is None and self.geterr():
+            r_metrics.error('incomplete')
+            if self.__debug:
+                log.warning("Incomplete recipe data")
 
     def convertedstr(self,string):
         """ This function cleans a string
@@ -256,65 +789,80 @@ class Recipe:
         Parameter:
             :string: str; holds string that might contain non-ASCII characters
         """
-        out = []
-        unwanted = {
-            '\u2009':' ',
-            '\u00bc':'1/4',
-            '\u00bd':'1/2',
-            '\u00be':'3/4',
-            '\u2153':'1/3',
-            '\u2154':'2/3',
-            '\u2155':'1/5',
-            '\u2156':'2/5',
-            '\u2157':'3/5',
-            '\u2158':'4/5',
-            '\u2159':'1/6',
-            '\u215a':'5/6',
-            '\u215b':'1/8',
-            '\u215c':'3/8',
-            '\u215d':'5/8',
-            '\u215e':'7/8',
-            '\u0026':'&',
-            '-':' '
-        }
-
-        for ch in string:
-            if ch in unwanted.keys():
-                out.append(unwanted[ch])
-            else:
-                out.append(ch)
-        return "".join(out);
+        return string.translate(UNWANTED)
 
     def cleaning(self,ing):
         """ This function takes a string and extracts the base ingredient
         
+        Returns the base ingredient of a single ingredient string, see cleanbatch
+
+        Parameter:
+            :ing: str, holds the ingredient string
+        """
+        return self.cleanbatch([ing])[0]
+
+    def cleanbatch(self,ings):
+        """ This function extracts the base ingredient of every string in a batch
+
+        Takes the ingredient strings of a recipe, or of a whole chunk of recipes, and returns the list of their base
+        ingredients in the same order. Strings are looked up in the memo of cleaned ingredients when enabled and
+        only the misses are parsed, all in a single parsebatch call. A change to what parsebatch returns must bump
+        memo.CLEANING_VERSION, or persisted memos keep serving the old results
+
+        Parameter:
+            :ings: list; holds the ingredient strings
+        """
+        with r_metrics.timer('cleaning'):
+            if r_memo is not None:
+                return r_memo.getmany(ings,self.parsebatch)
+            return self.parsebatch(ings)
+
+    def parsebase(self,ing):
+        """ This function takes a string and extracts the base ingredient
+
         Analyzes the parts of speech in ingredient string and returns the substring which holds the base ingredient
 
+        Parameter:
+            :ing: str, holds the ingredient string
+        """
+        return self.parsebatch([ing])[0]
+
+    def parsebatch(self,ings):
+        """ This function extracts the base ingredient of every string in a batch without the memo
+
+        Strips keywords from every string, tags all of them in one tagbatch call and then picks the base
+        ingredient of each from its tags
+
+        Parameter:
+            :ings: list; holds the ingredient strings
+        """
+        return [self.choosebase(w) for w in tagbatch([self.stripkeys(ing) for ing in ings])]
+
+    def stripkeys(self,ing):
+        """ This function parses certain keywords out of an ingredient string
+
         Parameter:
             :ing: str, holds the ingredient string
         """
         # if found certain keywords, parse them out
-        keys = [
-            '\([\w ]*\)',
-            '[Oo]ptional',
-            '[Wa]rm',
-            '[Rr]oom [Tt]emperature',
-            '[Pp]ackage',
-            '[Ss]tiffly [Bb]eaten',
-            '[Ff]rying',
-            '[Tt]ablespoons?',
-            '[Tt]easpoons?',
-            '[Ss]uch'
-        ]
-        for key in keys:
-            r = search(key,ing)
+        for key in KEYS:
+            r = key.search(ing)
             if r:
                 if r.group(0)[0] != '(':
                     ing = ing[:r.start()] + ing[r.end():]
                 ing = ing[:r.start()] + 'of' + ing[r.end():]
+        return ing
+
+    def choosebase(self,tags):
+        """ This function picks the base ingredient out of a tagged ingredient string
+
+        Returns the substring which holds the base ingredient
 
+        Parameter:
+            :tags: list; holds the word,part of speech tuples of the ingredient string
+        """
         # initialize a list with parts of speech tuples for each word in the ingredient string and reverse it to process it backwards
-        w = tb(ing).tags
+        w = list(tags)
         w.reverse()
 
         # check if only one noun, in which case return just the noun
@@ -356,78 +904,126 @@ class Recipe:
     def getnutri(self):
         """ This function fetches the nutrition facts of the recipe
 
-        Returns a dictionary of key:value pairs containing nutrition info
+        Returns a float32 array of nutrition values, see nutripairs
         """
-        # initialize output dictionary and initiliaze name:value pairs if possible
-        out = {}
+        # initiliaze name:value pairs if possible
         try:
             pairs = [s.get_text(strip=True) for s in self.__soup.find_all("span",class_='nutrient-name')]
             names = [s[:s.find(':')] for s in pairs]
             vals = [s[s.find(':')+1:] for s in pairs]
        
-            # if no error, standardize names, record the pairs in dictionary and return
-            self.standardize(names,vals)
-            for name,val in zip(names,vals):
-                out[name] = val
-            return out
+            # if no error, parse the values into their standardized columns and return
+            return self.nutripairs(names,vals)
 
         except:
+            r_metrics.error('nutrition')
             if self.__debug:
-                print("Problem getting nutrition")
+                log.warning("Problem getting nutrition")
             return None
 
-    def standardize(self,names,vals):
-        """ This function regularizes nutrition names
+    def nutripairs(self,names,vals):
+        """ This function builds the nutrition array
 
-        Ensures that seperate nutrition factsheets are mapped to the same model and returns the standardized name,val pairs
+        Looks every name up in the precompiled SCHEMA and parses its value into its column, normalized to the
+        column's unit. Returns a float32 array in NUTRIENTS order, NaN for nutrients not listed, unknown names dropped
 
         Parameters:
             :names: list; holds all names of nutrition items
             :vals: list; holds all associated values to names
         """
-        # create standardization set
-        standard = {
-            "fat":"Total Fat",
-            "saturated fat":"Saturated Fat",
-            "cholesterol":"Cholesterol",
-            "sodium":"Sodium",
-            "potassium":"Potassium",
-            "carbohydrates":"Total Carbohydrates",
-            "dietary fiber":"Dietary Fiber",
-            "protein":"Protein",
-            "sugars":"Sugars",
-            "vitamin a iu":"Vitamin A",
-            "vitamin c":"Vitamin C",
-            "calcium":"Calcium",
-            "iron":"Iron",
-            "thiamin":"Thiamin",
-            "niacin equivalents":"Niacin",
-            "niacin equivilants":"Niacin",
-            "vitamin b6":"Vitamin B6",
-            "magnesium":"Magnesium",
-            "folate":"Folate",
-            "vitamin c":"Vitamin C",
-            "calories from fat":"Cals from Fat"
-        }
-        # for items already in names, make sure it is standardized value
-        for i,name in enumerate(names):
-            if standard.get(name.lower()):
-                names[i] = standard.get(name.lower())
-        # for items not in names, remove
-        for diff in set(names).difference(standard.values()):
-            idx = names.index(diff)
-            names.remove(diff)
-            vals.remove(vals[idx])
+        out = NOVALUES[:]
+        for name,val in zip(names,vals):
+            col = SCHEMA.get(name.strip().lower())
+            if col is not None:
+                out[col[0]] = nutrivalue(val,col[1])
+        return out
 
     def geterr(self):
         """ This function reports if any error occurred in scraping process
 
         Returns boolean should any attribute return None or if any ingredient in the list is None
         """
-        if None in self.ingredients:
-            if self.__debug:
-                print('Empty ingredient pulled')
-            return True
         if self.name is None or self.nutrition is None or self.rating is None or self.ingredients is None:
             return True
-        return False
+        return None in self.ingredients
+
+class Duplicate:
+    """ Result of scraping a recipe already scraped under another url
+
+    A distinct outcome from a failure, so that stores such as a Checkpoint keep it like a successful result rather
+    than scraping the url again on every run. Pickles as a single flat tuple like RecipeRecord
+
+    Attributes:
+        :first: string; holds the url the recipe was first scraped at
+    """
+    __slots__ = ('first',)
+
+    def __init__(self,first):
+        self.first = first
+
+    def __reduce__(self):
+        return (Duplicate,(self.first,))
+
+class RecipeRecord:
+    """ Compact result of scraping a recipe
+
+    Holds only the extracted features of a recipe scraped without error, in slots rather than a __dict__, and pickles
+    as a single flat tuple. This is what worker processes send back instead of Recipe objects
+
+    Attributes:
+        :name: string; holds the title of the recipe
+        :rating: float; holds the average rating of the recipe
+        :ingredients: tuple; holds the base ingredients of the recipe
+        :nutrition: array; holds float32 nutrition values in NUTRIENTS order and UNITS, NaN where not listed
+
+    Methods:
+        :fromrecipe: returns the record of a Recipe
+    """
+    __slots__ = ('name','rating','ingredients','nutrition')
+
+    def __init__(self,name,rating,ingredients,nutrition):
+        self.name = name
+        self.rating = rating
+        self.ingredients = ingredients
+        self.nutrition = nutrition
+
+    def __reduce__(self):
+        return (RecipeRecord,(self.name,self.rating,self.ingredients,self.nutrition))
+
+    @classmethod
+    def fromrecipe(cls,r):
+        """ This function returns the record of a recipe
+
+        Parameter:
+            :r: Recipe; holds a recipe scraped without error
+        """
+        return cls(r.name,r.rating,tuple(r.ingredients),r.nutrition)
+
+def scrape_record(url,html=None,fast=False):
+    """ This function scrapes a recipe into a compact record
+
+    Returns the RecipeRecord of the recipe at url, None if any scraping error occurred, or a Duplicate if the recipe
+    was already scraped under another url. Checking for errors here means failed recipes never leave the worker
+    process. When deduplication is enabled, a recipe scraped without error claims its fingerprint here, so only
+    valid recipes ever hide their copies. Recipes sampled by the metrics are scraped under cProfile
+
+    Parameters:
+        :url: str; contains recipe webpage
+        :html: bytes; holds the already fetched page html, None to fetch it
+        :fast: bool; if True, extracts with Recipe.fastparse
+    """
+    if r_metrics.sampled(url):
+        r = r_metrics.profiled(url,Recipe,url,False,fast,html)
+    else:
+        r = Recipe(url,fast=fast,html=html)
+    r_metrics.add('recipes')
+    if r.duplicate is None and not r.geterr() and r.fingerprint is not None:
+        r.duplicate = r_seen.claim(r.fingerprint,url)
+    if r.duplicate is not None:
+        r_metrics.add('duplicates')
+        log.info('Skipped %s, a duplicate of %s',url,r.duplicate)
+        return Duplicate(r.duplicate)
+    if r.geterr():
+        r_metrics.add('failed')
+        return None
+    return RecipeRecord.fromrecipe(r)
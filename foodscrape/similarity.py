@@ -0,0 +1,279 @@
+import os
+import numpy as np
+from foodscrape.scraping import NUTRIENTS
+from foodscrape.matrix import openmatrix
+from foodscrape.matrix import readlines
+
+# GLOBAL constant for the file names of a saved index directory
+TERMS,KEYS,ARRAYS = 'terms.txt','keys.txt','index.npz'
+
+# GLOBAL constant for the scoring metrics of a query
+METRICS = ('dot','jaccard')
+
+class SimilarityIndex:
+    """ Top-k recipe similarity index over one-hot ingredient encodings
+
+    Keeps every recipe as the sorted column ids of its ingredients, a CSR matrix without values, along with an
+    inverted index from every ingredient to the ids of the recipes listing it and the float32 nutrition block of
+    every recipe. A query only reads the postings of its own ingredients: the overlap of the query with every
+    recipe sharing an ingredient is counted in one bincount, which is the sparse dot product of the one-hot
+    vectors, and scored by dot product or Jaccard similarity before the top k are picked. Recipes are added
+    incrementally under stable ids, the inverted index is rebuilt on the first query after an addition
+
+    Attributes:
+        :terms: list; holds every ingredient by column id
+        :ids: dict; holds the column id of every ingredient
+        :keys: list; holds the key of every recipe, such as its url, by recipe id
+        :rows: dict; holds the recipe id of every key
+        :nutrition: ndarray; holds the float32 nutrition values of every recipe in NUTRIENTS order, NaN where not listed
+
+    Methods:
+        :add: adds recipes whose key is not indexed yet
+        :search: returns the top k recipes for a collection of ingredients
+        :similar: returns the top k recipes like an indexed recipe
+        :save: writes the index to a directory
+        :load: reads an index written by save
+    """
+    def __init__(self):
+        self.terms = []
+        self.ids = {}
+        self.keys = []
+        self.rows = {}
+        self.nutrition = np.zeros((0,len(NUTRIENTS)),dtype=np.float32)
+        self.__indptr = np.zeros(1,dtype=np.int64)
+        self.__indices = np.zeros(0,dtype=np.int32)
+        self.__postptr = None
+        self.__postings = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self,key):
+        return key in self.rows
+
+    @classmethod
+    def fromframe(cls,df):
+        """ This function builds an index from a recipe dataframe
+
+        Takes the frame of makeFrame or streamFrames, or its encoding from encode, which keeps the Ingredients and
+        nutrition columns
+
+        Parameter:
+            :df: DataFrame; holds features for processed recipes, indexed by url
+        """
+        index = cls()
+        index.add(list(df.index),df.Ingredients,df[NUTRIENTS].to_numpy(dtype=np.float32))
+        return index
+
+    @classmethod
+    def fromencoded(cls,directory='data/encoded'):
+        """ This function builds an index from a persistent encoded matrix
+
+        Reuses the column ids of the matrix vocabulary. The matrix holds no nutrition, so every value is NaN and
+        nutrition filters match nothing
+
+        Parameter:
+            :directory: str; holds the directory of the encoded matrix
+        """
+        matrix,terms,keys = openmatrix(directory)
+        index = cls()
+        index.terms = list(terms)
+        index.ids = {term:num for num,term in enumerate(terms)}
+        index.keys = list(keys)
+        index.rows = {key:num for num,key in enumerate(keys)}
+        index.__indptr = np.asarray(matrix.indptr,dtype=np.int64)
+        index.__indices = np.asarray(matrix.indices,dtype=np.int32)
+        index.nutrition = np.full((len(keys),len(NUTRIENTS)),np.nan,dtype=np.float32)
+        return index
+
+    def lookup(self,terms,grow=False):
+        """ This function returns the sorted, distinct column ids of a collection of ingredients
+
+        Parameters:
+            :terms: iterable; holds ingredient strings
+            :grow: bool; if True, gives ingredients not in the index the next ids, and otherwise leaves them out
+        """
+        out = set()
+        for term in terms:
+            num = self.ids.get(term)
+            if num is None:
+                if not grow:
+                    continue
+                num = self.ids[term] = len(self.terms)
+                self.terms.append(term)
+            out.add(num)
+        return sorted(out)
+
+    def add(self,keys,ingredients,nutrition=None):
+        """ This function adds recipes whose key is not indexed yet
+
+        Returns the number of recipes added
+
+        Parameters:
+            :keys: list; holds the key of every recipe, such as its url
+            :ingredients: iterable; holds the collection of base ingredients of every recipe, aligned with keys
+            :nutrition: ndarray; holds the recipes by NUTRIENTS nutrition values aligned with keys, None for NaN
+        """
+        if nutrition is None:
+            nutrition = np.full((len(keys),len(NUTRIENTS)),np.nan,dtype=np.float32)
+        cols,new = [],[]
+        for num,(key,ings) in enumerate(zip(keys,ingredients)):
+            if key in self.rows:
+                continue
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            cols.append(self.lookup(ings,grow=True))
+            new.append(num)
+        if not new:
+            return 0
+
+        lengths = np.fromiter((len(c) for c in cols),dtype=np.int64,count=len(cols))
+        self.__indices = np.concatenate([self.__indices,np.fromiter((n for c in cols for n in c),dtype=np.int32,
+                                                                    count=int(lengths.sum()))])
+        self.__indptr = np.concatenate([self.__indptr,self.__indptr[-1] + np.cumsum(lengths)])
+        self.nutrition = np.concatenate([self.nutrition,np.asarray(nutrition,dtype=np.float32)[new]])
+        self.__postptr = None
+        self.__postings = None
+        return len(new)
+
+    def invert(self):
+        """ This function rebuilds the inverted index if recipes were added since it was built
+
+        The postings of every ingredient are the recipe ids listing it in increasing order, stored flat in CSR form
+        """
+        if self.__postptr is not None:
+            return
+        rowids = np.repeat(np.arange(len(self.keys),dtype=np.int32),np.diff(self.__indptr))
+        order = np.argsort(self.__indices,kind='stable')
+        self.__postings = rowids[order]
+        self.__postptr = np.zeros(len(self.terms) + 1,dtype=np.int64)
+        np.cumsum(np.bincount(self.__indices,minlength=len(self.terms)),out=self.__postptr[1:])
+
+    def mask(self,filters):
+        """ This function returns which recipes pass a set of nutrition range filters
+
+        A recipe with no listed value for a filtered nutrient never passes
+
+        Parameter:
+            :filters: dict; holds a (low, high) pair of bounds for every filtered nutrient, None for an open bound
+        """
+        out = np.ones(len(self.keys),dtype=bool)
+        for name,(low,high) in filters.items():
+            col = self.nutrition[:,NUTRIENTS.index(name)]
+            out &= ~np.isnan(col)
+            if low is not None:
+                out &= col >= low
+            if high is not None:
+                out &= col <= high
+        return out
+
+    def query(self,cols,size,k,metric,filters,exclude=None):
+        """ This function scores every recipe sharing an ingredient with a query and returns the top k
+
+        Returns a list of (key, score) pairs in decreasing order of score
+
+        Parameters:
+            :cols: list; holds the column ids of the query ingredients
+            :size: int; holds the number of distinct query ingredients, known or not
+            :k: int; holds the number of recipes returned
+            :metric: str; holds the scoring metric, one of METRICS
+            :filters: dict; holds nutrition range filters, see mask, None for none
+            :exclude: int; holds the id of a recipe left out of the results, None for none
+        """
+        if metric not in METRICS:
+            raise ValueError('unknown metric {!r}, expected one of {}'.format(metric,', '.join(METRICS)))
+        self.invert()
+        if not cols or not len(self.keys):
+            return []
+        hits = np.concatenate([self.__postings[self.__postptr[c]:self.__postptr[c+1]] for c in cols])
+        overlap = np.bincount(hits,minlength=len(self.keys))
+
+        candidates = np.flatnonzero(overlap)
+        if filters:
+            candidates = candidates[self.mask(filters)[candidates]]
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        scores = overlap[candidates].astype(np.float32)
+        if metric == 'jaccard':
+            scores /= size + np.diff(self.__indptr)[candidates] - scores
+
+        if len(candidates) > k:
+            top = np.argpartition(-scores,k)[:k]
+            candidates,scores = candidates[top],scores[top]
+        # ties go to the recipe indexed first
+        order = np.lexsort((candidates,-scores))
+        return [(self.keys[num],float(score)) for num,score in zip(candidates[order],scores[order])]
+
+    def search(self,ingredients,k=10,metric='jaccard',filters=None):
+        """ This function returns the top k recipes using a collection of ingredients
+
+        Returns a list of (key, score) pairs in decreasing order of score. Ingredients are matched as cleaned base
+        ingredients; ones no recipe lists add nothing to the dot product but still count toward the Jaccard union
+
+        Parameters:
+            :ingredients: iterable; holds the base ingredients to search for
+            :k: int; holds the number of recipes returned
+            :metric: str; holds the scoring metric, dot for the number of shared ingredients or jaccard
+            :filters: dict; holds a (low, high) pair of bounds for every filtered nutrient, None for an open bound
+        """
+        ingredients = set(ingredients)
+        return self.query(self.lookup(ingredients),len(ingredients),k,metric,filters)
+
+    def similar(self,key,k=10,metric='jaccard',filters=None):
+        """ This function returns the top k recipes like an indexed recipe, leaving the recipe itself out
+
+        Parameters:
+            :key: str; holds the key of the indexed recipe, such as its url
+            :k: int; holds the number of recipes returned
+            :metric: str; holds the scoring metric, see search
+            :filters: dict; holds nutrition range filters, see search
+        """
+        num = self.rows[key]
+        cols = self.__indices[self.__indptr[num]:self.__indptr[num+1]].tolist()
+        return self.query(cols,len(cols),k,metric,filters,exclude=num)
+
+    def save(self,directory='data/index'):
+        """ This function writes the index to a directory
+
+        Ingredients and keys are written one per line, the recipes and nutrition as arrays in a .npz file. Each file
+        is written aside and moved into place, so a reader never sees a partially written index file
+
+        Parameter:
+            :directory: str; holds the directory of the index files
+        """
+        os.makedirs(directory,exist_ok=True)
+        for name,lines in ((TERMS,self.terms),(KEYS,self.keys)):
+            with open(os.path.join(directory,name + '.tmp'),'w',encoding='utf-8') as f:
+                f.writelines(f'{line}\n' for line in lines)
+        with open(os.path.join(directory,ARRAYS + '.tmp'),'wb') as f:
+            np.savez(f,indptr=self.__indptr,indices=self.__indices,nutrition=self.nutrition)
+        for name in (TERMS,KEYS,ARRAYS):
+            os.replace(os.path.join(directory,name + '.tmp'),os.path.join(directory,name))
+
+    @classmethod
+    def load(cls,directory='data/index'):
+        """ This function reads an index written by save
+
+        Parameter:
+            :directory: str; holds the directory of the index files
+        """
+        index = cls()
+        index.terms = readlines(os.path.join(directory,TERMS))
+        index.ids = {term:num for num,term in enumerate(index.terms)}
+        index.keys = readlines(os.path.join(directory,KEYS))
+        index.rows = {key:num for num,key in enumerate(index.keys)}
+        with np.load(os.path.join(directory,ARRAYS)) as arrays:
+            index.__indptr = arrays['indptr']
+            index.__indices = arrays['indices']
+            index.nutrition = arrays['nutrition']
+        return index
+
+def openindex(directory='data/index'):
+    """ This function returns the index saved in a directory, or a new empty index if there is none
+
+    Parameter:
+        :directory: str; holds the directory of the index files
+    """
+    if os.path.exists(os.path.join(directory,ARRAYS)):
+        return SimilarityIndex.load(directory)
+    return SimilarityIndex()
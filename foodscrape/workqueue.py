@@ -0,0 +1,204 @@
+import json
+import time
+import sqlite3
+
+# GLOBAL constant for the default number of seconds a leased shard stays with its worker without a renewal
+DEFAULT_LEASE = 300
+
+# GLOBAL constant for the default number of urls per shard
+DEFAULT_SHARD = 100
+
+# GLOBAL constant for the number of leases a shard gets before it is given up as failed
+MAX_ATTEMPTS = 3
+
+class WorkQueue:
+    """ Shared queue of url shards leased to independent workers
+
+    Shards are lists of category urls to expand or recipe urls to scrape, kept in an SQLite file every worker opens,
+    whether processes on one host or hosts sharing a filesystem with working locks. A worker leases a shard for
+    lease seconds and renews the lease as it makes progress; a shard whose lease runs out, because its worker
+    crashed or hung, goes to the next worker asking, until it has been leased MAX_ATTEMPTS times. Every url is
+    queued at most once, and no more recipe urls are queued than the quantity the queue was seeded with
+
+    Attributes:
+        :path: str; holds the path of the SQLite file
+        :lease: float; holds the seconds a lease lasts without renewal
+
+    Methods:
+        :seed: sets the quantity of recipes and queues the root category urls
+        :add: queues new urls in shards
+        :take: leases the next available shard
+        :renew: extends the lease of a shard
+        :complete: marks a leased shard done
+        :release: hands a leased shard back without counting it done
+        :full: returns whether the quantity of recipe urls has been queued
+        :busy: returns whether any shard is still pending or leased
+        :links: returns every queued recipe url in the order it was found
+        :stats: returns the number of shards in each state
+        :close: closes the queue
+    """
+    def __init__(self,path='queue.sqlite',lease=DEFAULT_LEASE):
+        self.path = path
+        self.lease = lease
+        # the default rollback journal rather than WAL, which needs shared memory that hosts cannot share
+        self.__conn = sqlite3.connect(path,timeout=60,isolation_level=None)
+        self.__conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY, kind TEXT NOT NULL, urls TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT, expires REAL, attempts INTEGER NOT NULL DEFAULT 0);
+            CREATE INDEX IF NOT EXISTS shards_state ON shards (state);
+            CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY, kind TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);""")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def transaction(self):
+        """ This function starts a write transaction, taking the database lock before anything is read
+        """
+        self.__conn.execute("BEGIN IMMEDIATE")
+        return self.__conn
+
+    def seed(self,urls,quant,size=DEFAULT_SHARD):
+        """ This function sets up a new queue
+
+        Parameters:
+            :urls: list; holds the category urls the crawl starts from
+            :quant: int; holds the number of recipes to scrape, float('inf') for all of them
+            :size: int; holds the number of recipe urls per shard
+        """
+        conn = self.transaction()
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('quant',?),('size',?)",(quant,size))
+        conn.execute("COMMIT")
+        self.add('category',urls)
+
+    def setting(self,key):
+        """ This function returns a setting the queue was seeded with
+
+        Parameter:
+            :key: str; holds the name of the setting, quant or size
+        """
+        row = self.__conn.execute("SELECT value FROM meta WHERE key=?",(key,)).fetchone()
+        return None if row is None else row[0]
+
+    def add(self,kind,urls):
+        """ This function queues the urls not queued before
+
+        Returns the number of urls queued. Category urls go one per shard, so that subtrees spread over workers,
+        and recipe urls go size per shard until the seeded quantity is reached
+
+        Parameters:
+            :kind: str; holds the kind of url, category or recipe
+            :urls: list; holds the urls
+        """
+        quant = self.setting('quant')
+        size = 1 if kind == 'category' else self.setting('size') or DEFAULT_SHARD
+        conn = self.transaction()
+        try:
+            room = float('inf')
+            if kind == 'recipe' and quant is not None:
+                room = quant - conn.execute("SELECT COUNT(*) FROM seen WHERE kind='recipe'").fetchone()[0]
+            new = []
+            for url in urls:
+                if len(new) >= room:
+                    break
+                if conn.execute("INSERT OR IGNORE INTO seen VALUES (?,?)",(url,kind)).rowcount:
+                    new.append(url)
+            conn.executemany("INSERT INTO shards (kind,urls) VALUES (?,?)",
+                             [(kind,json.dumps(new[n:n+size])) for n in range(0,len(new),size)])
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return len(new)
+
+    def take(self,owner):
+        """ This function leases the next available shard
+
+        Returns the id, kind and urls of the oldest shard that is pending or whose lease ran out, or None if there
+        is none. A shard leased MAX_ATTEMPTS times without completing is marked failed instead
+
+        Parameter:
+            :owner: str; holds the name of the worker taking the lease
+        """
+        conn = self.transaction()
+        try:
+            now = time.time()
+            conn.execute(
+                "UPDATE shards SET state='failed' WHERE (state='pending' OR (state='leased' AND expires<?)) AND attempts>=?",
+                (now,MAX_ATTEMPTS))
+            row = conn.execute(
+                "SELECT id,kind,urls FROM shards WHERE state='pending' OR (state='leased' AND expires<?) ORDER BY id LIMIT 1",
+                (now,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE shards SET state='leased',owner=?,expires=?,attempts=attempts+1 WHERE id=?",
+                             (owner,now + self.lease,row[0]))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0],row[1],json.loads(row[2])
+
+    def renew(self,shard,owner):
+        """ This function extends the lease of a shard
+
+        Returns False if the lease ran out and the shard went to another worker
+
+        Parameters:
+            :shard: int; holds the id of the shard
+            :owner: str; holds the name of the worker holding the lease
+        """
+        cur = self.__conn.execute("UPDATE shards SET expires=? WHERE id=? AND owner=? AND state='leased'",
+                                  (time.time() + self.lease,shard,owner))
+        return cur.rowcount > 0
+
+    def complete(self,shard,owner):
+        """ This function marks a leased shard done
+
+        Parameters:
+            :shard: int; holds the id of the shard
+            :owner: str; holds the name of the worker holding the lease
+        """
+        self.__conn.execute("UPDATE shards SET state='done',expires=NULL WHERE id=? AND owner=? AND state='leased'",
+                            (shard,owner))
+
+    def release(self,shard,owner):
+        """ This function hands a leased shard back to the queue, to be leased again unless it ran out of attempts
+
+        Parameters:
+            :shard: int; holds the id of the shard
+            :owner: str; holds the name of the worker holding the lease
+        """
+        self.__conn.execute("UPDATE shards SET state='pending',owner=NULL,expires=NULL WHERE id=? AND owner=? AND state='leased'",
+                            (shard,owner))
+
+    def full(self):
+        """ This function returns whether the seeded quantity of recipe urls has been queued
+        """
+        quant = self.setting('quant')
+        return quant is not None and self.__conn.execute("SELECT COUNT(*) FROM seen WHERE kind='recipe'").fetchone()[0] >= quant
+
+    def busy(self):
+        """ This function returns whether any shard is still pending or leased
+        """
+        return self.__conn.execute("SELECT 1 FROM shards WHERE state IN ('pending','leased') LIMIT 1").fetchone() is not None
+
+    def links(self):
+        """ This function returns every queued recipe url in the order it was found
+        """
+        return [url for url, in self.__conn.execute("SELECT url FROM seen WHERE kind='recipe' ORDER BY rowid")]
+
+    def stats(self):
+        """ This function returns a dict of the number of shards in each state
+        """
+        return dict(self.__conn.execute("SELECT state,COUNT(*) FROM shards GROUP BY state"))
+
+    def close(self):
+        """ This function closes the queue
+        """
+        self.__conn.close()
@@ -0,0 +1,231 @@
+import bz2
+import gzip
+import lzma
+from abc import ABC
+from abc import abstractmethod
+
+# GLOBAL map from compression names to functions opening a compressed text stream
+OPENERS = {
+    None:open,
+    'gzip':gzip.open,
+    'bz2':bz2.open,
+    'xz':lzma.open
+}
+
+def joined(df):
+    """ This function returns a copy of a DataFrame with ingredient collections joined into strings
+
+    Parameter:
+        :df: DataFrame; holds recipe features
+    """
+    if 'Ingredients' not in df.columns:
+        return df
+    df = df.copy()
+    df['Ingredients'] = df.Ingredients.apply(lambda x: '; '.join(sorted(i.strip() for i in x)))
+    return df
+
+def opentext(filename,compression):
+    """ This function opens a text stream for writing, compressed with the given codec
+
+    Parameters:
+        :filename: string; holds the name of the output file
+        :compression: string; holds one of the codecs in OPENERS
+    """
+    if compression not in OPENERS:
+        raise ValueError('unsupported compression {} for text output'.format(compression))
+    return OPENERS[compression](filename,'wt',newline='')
+
+def arrowtable(pa,df,schema=None):
+    """ This function converts a DataFrame to an arrow table, ingredient collections becoming list columns
+
+    Parameters:
+        :pa: module; holds the pyarrow module
+        :df: DataFrame; holds recipe features
+        :schema: Schema; holds the schema of earlier chunks, None for the first chunk
+    """
+    if 'Ingredients' in df.columns:
+        df = df.copy()
+        df['Ingredients'] = df.Ingredients.apply(list)
+    return pa.Table.from_pandas(df,schema=schema,preserve_index=False)
+
+class Writer(ABC):
+    """ Abstract base class of the output writers
+
+    A writer is opened on a file, receives recipe DataFrames chunk by chunk through write and finishes the file on
+    close; it can be used as a context manager. Every chunk must have the same columns as the first
+
+    Attributes:
+        :filename: string; holds the name of the output file
+        :compression: string; holds the compression codec, None for the backend default
+
+    Methods:
+        :write: appends a DataFrame chunk to the output
+        :close: finishes the output file
+    """
+    def __init__(self,filename,compression=None):
+        self.filename = filename
+        self.compression = compression
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    @abstractmethod
+    def write(self,df):
+        """ This function appends a DataFrame chunk to the output
+
+        Parameter:
+            :df: DataFrame; holds recipe features
+        """
+
+    def close(self):
+        pass
+
+class CsvWriter(Writer):
+    """ Writes chunks to a single csv stream, optionally gzip, bz2 or xz compressed
+
+    Ingredients are joined into "; " separated strings
+    """
+    def __init__(self,filename,compression=None):
+        super().__init__(filename,compression)
+        self.__f = opentext(filename,compression)
+        self.__header = True
+
+    def write(self,df):
+        joined(df).to_csv(self.__f,header=self.__header,index=False)
+        self.__header = False
+
+    def close(self):
+        self.__f.close()
+
+class JsonlWriter(Writer):
+    """ Writes chunks as one json object per recipe per line, optionally gzip, bz2 or xz compressed
+
+    Ingredients are written as json arrays
+    """
+    def __init__(self,filename,compression=None):
+        super().__init__(filename,compression)
+        self.__f = opentext(filename,compression)
+
+    def write(self,df):
+        if df.empty:
+            return
+        df = df.copy()
+        if 'Ingredients' in df.columns:
+            df['Ingredients'] = df.Ingredients.apply(list)
+        text = df.to_json(orient='records',lines=True)
+        self.__f.write(text if text.endswith('\n') else text + '\n')
+
+    def close(self):
+        self.__f.close()
+
+class ParquetWriter(Writer):
+    """ Writes every chunk as a row group of a single parquet file, zstd compressed by default
+
+    Ingredients are written as list columns. Requires pyarrow
+    """
+    def __init__(self,filename,compression=None):
+        super().__init__(filename,compression or 'zstd')
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('pyarrow is required for parquet output')
+        self.__pa = pa
+        self.__pq = pq
+        self.__writer = None
+
+    def write(self,df):
+        table = arrowtable(self.__pa,df,self.__writer.schema if self.__writer is not None else None)
+        if self.__writer is None:
+            self.__writer = self.__pq.ParquetWriter(self.filename,table.schema,compression=self.compression)
+        self.__writer.write_table(table)
+
+    def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+
+class ArrowWriter(Writer):
+    """ Writes every chunk as a record batch of a single Arrow IPC (feather) file, zstd compressed by default
+
+    Ingredients are written as list columns. Requires pyarrow
+    """
+    def __init__(self,filename,compression=None):
+        super().__init__(filename,compression or 'zstd')
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError('pyarrow is required for arrow output')
+        self.__pa = pa
+        self.__writer = None
+        self.__schema = None
+
+    def write(self,df):
+        # an ipc file writer does not expose its schema, so the first chunk's is kept
+        table = arrowtable(self.__pa,df,self.__schema)
+        if self.__writer is None:
+            self.__schema = table.schema
+            options = self.__pa.ipc.IpcWriteOptions(compression=self.compression)
+            self.__writer = self.__pa.ipc.new_file(self.filename,self.__schema,options=options)
+        self.__writer.write_table(table)
+
+    def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+
+class ExcelWriter(Writer):
+    """ Writes chunks to a single sheet of an xlsx workbook through xlsxwriter
+
+    Excel files cannot be appended to, so chunks are kept until close writes the whole sheet. Ingredients are
+    joined into "; " separated strings
+    """
+    def __init__(self,filename,compression=None):
+        super().__init__(filename,compression)
+        self.__chunks = []
+
+    def write(self,df):
+        self.__chunks.append(joined(df))
+
+    def close(self):
+        import pandas as pd
+        df = pd.concat(self.__chunks,ignore_index=True) if self.__chunks else pd.DataFrame()
+        with pd.ExcelWriter(self.filename,engine='xlsxwriter') as writer:
+            df.to_excel(writer,sheet_name='Sheet1',index=False)
+
+# GLOBAL map from output formats to their writer and file extension
+WRITERS = {
+    'xlsx':(ExcelWriter,'xlsx'),
+    'csv':(CsvWriter,'csv'),
+    'jsonl':(JsonlWriter,'jsonl'),
+    'parquet':(ParquetWriter,'parquet'),
+    'arrow':(ArrowWriter,'arrow')
+}
+
+# GLOBAL map from compression names to the file extension they add to text formats
+SUFFIXES = {
+    'gzip':'.gz',
+    'bz2':'.bz2',
+    'xz':'.xz'
+}
+
+def makewriter(fmt,filename=None,compression=None):
+    """ This function opens a writer for an output format
+
+    Returns the writer for fmt on filename. Without a filename, writes "data/recipes" with the extension of the
+    format, plus the compression suffix for text formats
+
+    Parameters:
+        :fmt: string; holds one of the formats in WRITERS
+        :filename: string; holds the name of the output file, None for the default
+        :compression: string; holds the compression codec, None for the backend default
+    """
+    if fmt not in WRITERS:
+        raise ValueError('unknown output format {}, expected one of {}'.format(fmt,', '.join(WRITERS)))
+    cls,ext = WRITERS[fmt]
+    if filename is None:
+        filename = 'data/recipes.' + ext
+        if cls in (CsvWriter,JsonlWriter):
+            filename += SUFFIXES.get(compression,'')
+    return cls(filename,compression)
@@ -1,8 +1,11 @@
+import sys
+import logging
 from foodscrape.encoding import to_excel as tx
 
-def main():
-    print('beginning processing...')
-    tx(100)
+def main(fmt='xlsx'):
+    logging.basicConfig(level=logging.INFO,format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    logging.getLogger(__name__).info('beginning processing...')
+    tx(100,fmt=fmt,metrics='data/metrics.json')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main(*sys.argv[1:2])
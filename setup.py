@@ -2,10 +2,11 @@ from setuptools import find_packages, setup
 setup(
     name='foodscrape',
     packages=find_packages(include=['foodscrape']),
-    version='0.0.8',
+    version='0.0.9',
     description='Custom scraping library for allrecipes.com',
     author='Maximiliano Rivera-Patton',
     license='MIT',
-    install_requires=['bs4','textblob','pandas','xlsxwriter','sklearn'],
+    install_requires=['bs4','lxml','textblob','numpy','pandas','scipy','xlsxwriter','sklearn'],
+    extras_require={'arrow':['pyarrow']},
     setup_requires=['pytest-runner']
 )
\ No newline at end of file
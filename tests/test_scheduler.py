@@ -0,0 +1,60 @@
+""" Tests of the request scheduler against the local stand-in server
+"""
+import os
+import sys
+import threading
+import pytest
+import requests
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','benchmarks'))
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from standin import StandIn
+from foodscrape.scheduler import RequestScheduler
+
+def within(seconds,func):
+    """ This function calls func on a daemon thread and returns its result, failing if it takes longer than seconds
+
+    Parameters:
+        :seconds: float; holds the seconds allowed
+        :func: function; holds the function called without arguments
+    """
+    out = {}
+    def run():
+        try:
+            out['result'] = func()
+        except Exception as exc:
+            out['error'] = exc
+    thread = threading.Thread(target=run,daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), 'call blocked for more than {} seconds'.format(seconds)
+    if 'error' in out:
+        raise out['error']
+    return out['result']
+
+def test_get_ok():
+    with StandIn(pages={'/':b'ok'}) as server:
+        sched = RequestScheduler(rate=100.0)
+        r = sched.get(server.url + '/')
+    assert r.status_code == 200
+    assert r.content == b'ok'
+    assert sched.stats == {'requests':1,'retries':0,'failures':0}
+
+def test_get_retries_then_returns_overload():
+    with StandIn(fail=1.0) as server:
+        sched = RequestScheduler(rate=100.0,retries=2,backoff=(0.01,0.01))
+        r = sched.get(server.url + '/')
+    assert r.status_code == 503
+    assert sched.stats == {'requests':3,'retries':2,'failures':1}
+
+def test_get_releases_slot_on_other_errors():
+    # every body is cut short, raising ChunkedEncodingError, which must not keep its concurrency slot
+    with StandIn(pages={'/':b'x'*1024},truncate=1.0) as server:
+        sched = RequestScheduler(rate=100.0,concurrency=(2,4))
+        for _ in range(2*sched.concurrency[1]):
+            with pytest.raises(requests.RequestException):
+                within(5.0,lambda: sched.get(server.url + '/'))
+        server.truncate = 0.0
+        r = within(5.0,lambda: sched.get(server.url + '/'))
+    assert r.status_code == 200
+    assert sched.stats['failures'] == 2*sched.concurrency[1]